@@ -0,0 +1,64 @@
+import struct
+from pathlib import Path
+
+SECTOR_SIZE = 4096
+CHUNKS_PER_REGION = 1024
+HEADER_SIZE = 2 * SECTOR_SIZE
+REGION_SUFFIXES = (".mca",)
+
+
+class RegionFormatError(ValueError):
+    pass
+
+
+def is_region_file(path: Path):
+    return Path(path).suffix.lower() in REGION_SUFFIXES
+
+
+def parse_region(data: bytes):
+    if len(data) < HEADER_SIZE:
+        raise RegionFormatError("Region file is smaller than its header")
+
+    locations = struct.unpack_from(">1024I", data, 0)
+    timestamps = struct.unpack_from(">1024I", data, SECTOR_SIZE)
+    chunks = []
+    for index, location in enumerate(locations):
+        if location == 0:
+            continue
+        offset = (location >> 8) * SECTOR_SIZE
+        sectors = location & 0xFF
+        if offset < HEADER_SIZE or offset + 5 > len(data):
+            raise RegionFormatError(f"Chunk {index} points outside the region file")
+        length = struct.unpack_from(">I", data, offset)[0]
+        end = offset + 4 + length
+        if length == 0 or end > len(data) or end > offset + sectors * SECTOR_SIZE:
+            raise RegionFormatError(f"Chunk {index} has an invalid length")
+        chunks.append((index, timestamps[index], data[offset:end]))
+    return chunks
+
+
+def build_region(chunks):
+    locations = [0] * CHUNKS_PER_REGION
+    timestamps = [0] * CHUNKS_PER_REGION
+    body = bytearray()
+    sector = HEADER_SIZE // SECTOR_SIZE
+    for index, timestamp, payload in sorted(chunks, key=lambda chunk: chunk[0]):
+        sectors = -(-len(payload) // SECTOR_SIZE)
+        if sectors > 0xFF:
+            raise RegionFormatError(f"Chunk {index} does not fit in a region file")
+        locations[index] = (sector << 8) | sectors
+        timestamps[index] = timestamp
+        body += payload
+        body += bytes(sectors * SECTOR_SIZE - len(payload))
+        sector += sectors
+    return struct.pack(">1024I", *locations) + struct.pack(">1024I", *timestamps) + bytes(body)
+
+
+def merge_chunks(current: bytes, backup: bytes, indexes):
+    chunks = {chunk[0]: chunk for chunk in parse_region(current)} if current else {}
+    for index in indexes:
+        chunks.pop(index, None)
+    for chunk in parse_region(backup):
+        if chunk[0] in indexes:
+            chunks[chunk[0]] = chunk
+    return build_region(chunks.values())
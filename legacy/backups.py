@@ -0,0 +1,744 @@
+import hashlib
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import anvil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_COMPRESSION_LEVEL = 6
+PRECOMPRESSED_SUFFIXES = (".mca", ".mcc", ".zip", ".gz", ".png", ".jar")
+PARALLEL_FILE_LIMIT = 16 * 1024 * 1024
+
+
+FICLONE = 0x40049409
+WALK_QUEUE_SIZE = 4096
+PROGRESS_INTERVAL = 2.0
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def format_bytes(size: float):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class ByteProgress:
+    def __init__(self, label: str = "Backup progress", interval: float = PROGRESS_INTERVAL):
+        self.label = label
+        self.interval = interval
+        self.total_bytes = 0
+        self.total_files = 0
+        self.done_bytes = 0
+        self.done_files = 0
+        self.walk_done = False
+        self.started = time.monotonic()
+        self._last_report = self.started
+        self._lock = threading.Lock()
+
+    def discovered(self, size: int):
+        with self._lock:
+            self.total_bytes += size
+            self.total_files += 1
+
+    def finish_walk(self):
+        self.walk_done = True
+
+    def advance(self, size: int):
+        with self._lock:
+            self.done_bytes += size
+            self.done_files += 1
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report()
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        rate = self.done_bytes / elapsed
+        if self.walk_done:
+            total = format_bytes(self.total_bytes)
+            percent = f"{self.done_bytes / self.total_bytes * 100:.0f}%" if self.total_bytes else "100%"
+            remaining = (self.total_bytes - self.done_bytes) / rate if rate else 0
+            eta = time.strftime("%H:%M:%S", time.gmtime(remaining))
+        else:
+            total = f">{format_bytes(self.total_bytes)}"
+            percent = "?%"
+            eta = "?"
+        print(f"{self.label}: {format_bytes(self.done_bytes)} / {total} ({percent}), "
+              f"{self.done_files} files, {format_bytes(rate)}/s, ETA {eta}")
+
+
+def dir_size(path: Path):
+    if not Path(path).is_dir():
+        return 0
+    return sum(entry.stat(follow_symlinks=False).st_size for _, _, entry in walk_files(path))
+
+
+def walk_files(source_path: Path):
+    stack = [(Path(source_path), Path())]
+    while stack:
+        directory, rel_dir = stack.pop()
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((Path(entry.path), rel_dir / entry.name))
+                elif entry.is_file():
+                    yield Path(entry.path), rel_dir / entry.name, entry
+
+
+def stream_files(source_path: Path, progress: ByteProgress = None, queue_size: int = WALK_QUEUE_SIZE):
+    items = queue.Queue(maxsize=queue_size)
+    done = object()
+    errors = []
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def walker():
+        try:
+            for full_path, rel_path, entry in walk_files(source_path):
+                st = entry.stat()
+                if progress:
+                    progress.discovered(st.st_size)
+                if not put((full_path, rel_path, st)):
+                    return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            if progress:
+                progress.finish_walk()
+            put(done)
+
+    thread = threading.Thread(target=walker, daemon=True)
+    thread.start()
+    try:
+        while (item := items.get()) is not done:
+            yield item
+    finally:
+        stop.set()
+    if errors:
+        raise errors[0]
+
+
+def _is_precompressed(path: Path):
+    return path.suffix.lower() in PRECOMPRESSED_SUFFIXES
+
+
+def _zip_info(rel_path: Path, st):
+    zinfo = zipfile.ZipInfo(Path(rel_path).as_posix(), date_time=time.localtime(st.st_mtime)[:6])
+    zinfo.external_attr = (st.st_mode & 0xFFFF) << 16
+    zinfo.file_size = st.st_size
+    return zinfo
+
+
+def _compress_entry(full_path: Path, rel_path: Path, st, level: int, store: bool):
+    zinfo = _zip_info(rel_path, st)
+    zinfo.compress_type = zipfile.ZIP_STORED if store else zipfile.ZIP_DEFLATED
+    if st.st_size > PARALLEL_FILE_LIMIT:
+        return zinfo, None
+
+    with open(full_path, "rb") as f:
+        data = f.read()
+    zinfo.file_size = len(data)
+    zinfo.CRC = zlib.crc32(data)
+    if store:
+        payload = data
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        payload = compressor.compress(data) + compressor.flush()
+    zinfo.compress_size = len(payload)
+    return zinfo, payload
+
+
+def _write_precompressed(zipf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, payload: bytes):
+    # Mirrors what ZipFile.writestr() does after compressing, so that the
+    # compression itself can happen on worker threads.
+    zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    zinfo.header_offset = zipf.fp.tell()
+    zipf.fp.write(zinfo.FileHeader(zip64))
+    zipf.fp.write(payload)
+    zipf.filelist.append(zinfo)
+    zipf.NameToInfo[zinfo.filename] = zinfo
+    zipf.start_dir = zipf.fp.tell()
+    zipf._didModify = True
+
+
+def write_zip(entries, destination: Path, level: int = DEFAULT_COMPRESSION_LEVEL, store_precompressed: bool = False,
+              workers: int = None, progress: ByteProgress = None):
+    workers = workers or default_workers()
+    written = 0
+
+    with zipfile.ZipFile(destination, 'w', zipfile.ZIP_DEFLATED, compresslevel=level) as zipf:
+        if workers == 1:
+            for full_path, rel_path, st in entries:
+                store = store_precompressed and _is_precompressed(full_path)
+                zipf.write(full_path, rel_path, zipfile.ZIP_STORED if store else zipfile.ZIP_DEFLATED)
+                written += 1
+                if progress:
+                    progress.advance(st.st_size)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+
+                def write_next():
+                    nonlocal written
+                    full_path, rel_path, future = pending.popleft()
+                    zinfo, payload = future.result()
+                    if payload is None:
+                        zipf.write(full_path, rel_path, zinfo.compress_type)
+                    else:
+                        _write_precompressed(zipf, zinfo, payload)
+                    written += 1
+                    if progress:
+                        progress.advance(zinfo.file_size)
+
+                for full_path, rel_path, st in entries:
+                    store = store_precompressed and _is_precompressed(full_path)
+                    future = pool.submit(_compress_entry, full_path, rel_path, st, level, store)
+                    pending.append((full_path, rel_path, future))
+                    if len(pending) >= workers * 2:
+                        write_next()
+                while pending:
+                    write_next()
+
+    if progress:
+        progress.report()
+    return written
+
+
+INCREMENTAL_FORMAT_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def blobs_path(backups_path: Path) -> Path:
+    return Path(backups_path) / "blobs"
+
+
+def blob_path(backups_path: Path, sha1: str, codec: str) -> Path:
+    return blobs_path(backups_path) / sha1[:2] / f"{sha1}.{codec}"
+
+
+def load_manifest(manifest_path: Path):
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def _store_blob(full_path: Path, backups_path: Path, level: int, store: bool):
+    codec = "raw" if store else "zz"
+    incoming = blobs_path(backups_path) / "incoming"
+    incoming.mkdir(parents=True, exist_ok=True)
+    tmp_path = incoming / f"{uuid.uuid4().hex}.tmp"
+    sha1 = hashlib.sha1()
+    size = 0
+    compressor = None if store else zlib.compressobj(level)
+    try:
+        with open(full_path, "rb") as src, open(tmp_path, "wb") as dst:
+            while chunk := src.read(HASH_CHUNK_SIZE):
+                sha1.update(chunk)
+                size += len(chunk)
+                dst.write(chunk if compressor is None else compressor.compress(chunk))
+            if compressor is not None:
+                dst.write(compressor.flush())
+        digest = sha1.hexdigest()
+        existing = _find_blob(backups_path, digest)
+        if existing is not None:
+            tmp_path.unlink()
+            return {"sha1": digest, "codec": existing, "size": size}, 0
+        target = blob_path(backups_path, digest, codec)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, target)
+        return {"sha1": digest, "codec": codec, "size": size}, size
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def _find_blob(backups_path: Path, sha1: str):
+    for codec in ("zz", "raw"):
+        if blob_path(backups_path, sha1, codec).exists():
+            return codec
+    return None
+
+
+def _store_bytes(backups_path: Path, data: bytes, sha1: str):
+    if _find_blob(backups_path, sha1) is not None:
+        return 0
+    target = blob_path(backups_path, sha1, "raw")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f"{target.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, target)
+    return len(data)
+
+
+def _store_region(full_path: Path, backups_path: Path):
+    with open(full_path, "rb") as f:
+        data = f.read()
+    chunks = []
+    stored = 0
+    for index, timestamp, payload in anvil.parse_region(data):
+        sha1 = hashlib.sha1(payload).hexdigest()
+        stored += _store_bytes(backups_path, payload, sha1)
+        chunks.append([index, timestamp, sha1])
+    return {"type": "region", "size": len(data), "chunks": chunks}, stored
+
+
+def _backup_file(full_path: Path, backups_path: Path, level: int, store: bool, region_dedup: bool):
+    if region_dedup and anvil.is_region_file(full_path):
+        try:
+            return _store_region(full_path, backups_path)
+        except anvil.RegionFormatError:
+            pass
+    return _store_blob(full_path, backups_path, level, store)
+
+
+def _is_unchanged(backups_path: Path, old: dict, st):
+    if not old or old["size"] != st.st_size or old["mtime_ns"] != st.st_mtime_ns:
+        return False
+    if old.get("type") == "region":
+        return True
+    return _find_blob(backups_path, old["sha1"]) == old["codec"]
+
+
+def write_incremental(source_path: Path, backups_path: Path, manifest_path: Path, parent_manifest: dict = None,
+                      level: int = DEFAULT_COMPRESSION_LEVEL, store_precompressed: bool = False, workers: int = None,
+                      region_dedup: bool = True, progress: ByteProgress = None):
+    workers = workers or default_workers()
+    previous = (parent_manifest or {}).get("files", {})
+    files = {}
+    changed = 0
+    stored_bytes = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+
+        def collect_next():
+            nonlocal stored_bytes
+            rel_path, st, future = pending.popleft()
+            entry, stored = future.result()
+            stored_bytes += stored
+            entry["mtime_ns"] = st.st_mtime_ns
+            files[rel_path] = entry
+            if progress:
+                progress.advance(st.st_size)
+
+        for full_path, rel_path, st in stream_files(source_path, progress):
+            rel_path = rel_path.as_posix()
+            old = previous.get(rel_path)
+            if _is_unchanged(backups_path, old, st):
+                files[rel_path] = old
+                if progress:
+                    progress.advance(st.st_size)
+                continue
+            changed += 1
+            store = store_precompressed and _is_precompressed(full_path)
+            future = pool.submit(_backup_file, full_path, backups_path, level, store, region_dedup)
+            pending.append((rel_path, st, future))
+            if len(pending) >= workers * 4:
+                collect_next()
+        while pending:
+            collect_next()
+
+    if progress:
+        progress.report()
+    total = len(files)
+    if total == 0:
+        return None
+
+    manifest = {
+        "format": "incremental",
+        "format_version": INCREMENTAL_FORMAT_VERSION,
+        "parent": (parent_manifest or {}).get("name"),
+        "name": Path(manifest_path).name,
+        "files": dict(sorted(files.items())),
+    }
+    tmp_path = Path(manifest_path).with_name(Path(manifest_path).name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+    return {"files": total, "changed": changed, "changed_bytes": stored_bytes}
+
+
+def _region_bytes(backups_path: Path, entry: dict):
+    chunks = []
+    for index, timestamp, sha1 in entry["chunks"]:
+        with open(blob_path(backups_path, sha1, "raw"), "rb") as f:
+            chunks.append((index, timestamp, f.read()))
+    return anvil.build_region(chunks)
+
+
+def _entry_bytes(backups_path: Path, entry: dict):
+    if entry.get("type") == "region":
+        return _region_bytes(backups_path, entry)
+    with open(blob_path(backups_path, entry["sha1"], entry["codec"]), "rb") as f:
+        data = f.read()
+    return zlib.decompress(data) if entry["codec"] == "zz" else data
+
+
+def _restore_region(backups_path: Path, entry: dict, target: Path):
+    data = _region_bytes(backups_path, entry)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with open(target, "wb") as f:
+        f.write(data)
+    os.utime(target, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+
+def _restore_blob(backups_path: Path, entry: dict, target: Path):
+    if entry.get("type") == "region":
+        return _restore_region(backups_path, entry, target)
+    source = blob_path(backups_path, entry["sha1"], entry["codec"])
+    target.parent.mkdir(parents=True, exist_ok=True)
+    decompressor = zlib.decompressobj() if entry["codec"] == "zz" else None
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        while chunk := src.read(HASH_CHUNK_SIZE):
+            dst.write(chunk if decompressor is None else decompressor.decompress(chunk))
+        if decompressor is not None:
+            dst.write(decompressor.flush())
+    os.utime(target, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+
+def restore_incremental(manifest: dict, backups_path: Path, target_path: Path, workers: int = None, members=None):
+    workers = workers or default_workers()
+    entries = manifest["files"]
+    names = list(entries) if members is None else list(members)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_restore_blob, backups_path, entries[name], Path(target_path) / name) for name in names]
+        for future in futures:
+            future.result()
+    return len(names)
+
+
+def _extract_members(zip_path: Path, names, target_path: Path):
+    with zipfile.ZipFile(zip_path) as zipf:
+        for name in names:
+            zipf.extract(name, target_path)
+
+
+def extract_zip(zip_path: Path, target_path: Path, workers: int = None, members=None):
+    workers = workers or default_workers()
+    with zipfile.ZipFile(zip_path) as zipf:
+        infos = [info for info in zipf.infolist() if members is None or info.filename in members]
+
+    # ZipFile.extract() races on creating shared parent folders, so create
+    # them up front and split the members into groups of similar total size.
+    target_path = Path(target_path)
+    target_path.mkdir(parents=True, exist_ok=True)
+    for info in infos:
+        folder = info.filename if info.is_dir() else os.path.dirname(info.filename)
+        if folder:
+            (target_path / folder).mkdir(parents=True, exist_ok=True)
+
+    groups = [[] for _ in range(workers)]
+    sizes = [0] * workers
+    for info in sorted(infos, key=lambda info: info.file_size, reverse=True):
+        if info.is_dir():
+            continue
+        smallest = sizes.index(min(sizes))
+        groups[smallest].append(info.filename)
+        sizes[smallest] += info.file_size
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_extract_members, zip_path, group, target_path) for group in groups if group]
+        for future in futures:
+            future.result()
+    return len(infos)
+
+
+def list_backup_members(backup_path: Path, backup_format: str):
+    if backup_format == "incremental":
+        return list(load_manifest(backup_path)["files"])
+    if backup_format == "snapshot":
+        return [rel_path.as_posix() for _, rel_path, _ in walk_files(backup_path)]
+    with zipfile.ZipFile(backup_path) as zipf:
+        return [info.filename for info in zipf.infolist() if not info.is_dir()]
+
+
+def _merge_region(read_member, name: str, indexes, target_path: Path):
+    target = Path(target_path) / name
+    current = target.read_bytes() if target.exists() else None
+    merged = anvil.merge_chunks(current, read_member(name), indexes)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(target.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(merged)
+    os.replace(tmp_path, target)
+
+
+def restore_members(backup_path: Path, backup_format: str, backups_path: Path, target_path: Path,
+                    whole, partial: dict, workers: int = None):
+    workers = workers or default_workers()
+    target_path = Path(target_path)
+    local = threading.local()
+    opened = []
+
+    if backup_format == "incremental":
+        manifest = load_manifest(backup_path)
+        restore_incremental(manifest, backups_path, target_path, workers=workers, members=whole)
+        read_member = lambda name: _entry_bytes(backups_path, manifest["files"][name])
+    elif backup_format == "snapshot":
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for name in whole:
+                (target_path / name).parent.mkdir(parents=True, exist_ok=True)
+                futures.append(pool.submit(_clone_file, Path(backup_path) / name, target_path / name))
+            for future in futures:
+                future.result()
+        read_member = lambda name: (Path(backup_path) / name).read_bytes()
+    else:
+        if whole:
+            extract_zip(backup_path, target_path, workers=workers, members=set(whole))
+
+        def read_member(name):
+            # ZipFile objects are not safe to share between threads.
+            if not hasattr(local, "zipf"):
+                local.zipf = zipfile.ZipFile(backup_path)
+                opened.append(local.zipf)
+            return local.zipf.read(name)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_merge_region, read_member, name, indexes, target_path)
+                       for name, indexes in partial.items()]
+            for future in futures:
+                future.result()
+    finally:
+        for zipf in opened:
+            zipf.close()
+    return len(whole), len(partial)
+
+
+def snapshot_files(source_path: Path, names, target_path: Path, workers: int = None):
+    workers = workers or default_workers()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for name in names:
+            source = Path(source_path) / name
+            if not source.is_file():
+                continue
+            target = Path(target_path) / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            futures.append(pool.submit(_clone_file, source, target))
+        for future in futures:
+            future.result()
+    return len(futures)
+
+
+def collect_garbage(backups_path: Path, manifests):
+    referenced = set()
+    for manifest in manifests:
+        for entry in manifest.get("files", {}).values():
+            if entry.get("type") == "region":
+                referenced.update(f"{sha1}.raw" for _, _, sha1 in entry["chunks"])
+            else:
+                referenced.add(f"{entry['sha1']}.{entry['codec']}")
+
+    removed = 0
+    freed = 0
+    root = blobs_path(backups_path)
+    if not root.is_dir():
+        return removed, freed
+    for prefix_dir in root.iterdir():
+        if not prefix_dir.is_dir() or prefix_dir.name == "incoming":
+            continue
+        for blob in prefix_dir.iterdir():
+            if blob.name not in referenced:
+                freed += blob.stat().st_size
+                blob.unlink()
+                removed += 1
+    return removed, freed
+
+
+def _clone_file(source: Path, target: Path):
+    if fcntl is not None:
+        try:
+            with open(source, "rb") as src, open(target, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            shutil.copystat(source, target)
+            return "reflink"
+        except OSError:
+            pass
+    shutil.copy2(source, target)
+    return "copy"
+
+
+def snapshot_tree(source_path: Path, target_path: Path, workers: int = None):
+    # Region files are rewritten in place by the server, so hardlinks would
+    # not freeze their contents; only reflinks or real copies are safe here.
+    workers = workers or default_workers()
+    Path(target_path).mkdir(parents=True, exist_ok=True)
+    methods = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for full_path, rel_path, _ in walk_files(source_path):
+            target = Path(target_path) / rel_path
+            target.parent.mkdir(parents=True, exist_ok=True)
+            futures.append(pool.submit(_clone_file, full_path, target))
+        for future in futures:
+            method = future.result()
+            methods[method] = methods.get(method, 0) + 1
+    return methods
+
+
+VERIFY_BATCH_BYTES = 64 * 1024 * 1024
+
+
+def _verify_zip_members(zip_path: Path, names):
+    errors = []
+    try:
+        with zipfile.ZipFile(zip_path) as zipf:
+            for name in names:
+                try:
+                    with zipf.open(name) as member:
+                        while member.read(HASH_CHUNK_SIZE):
+                            pass
+                except (zipfile.BadZipFile, zlib.error, OSError) as e:
+                    errors.append(f"{name}: {e}")
+    except (zipfile.BadZipFile, OSError) as e:
+        errors.append(str(e))
+    return errors
+
+
+def _verify_blobs(backups_path: Path, blobs):
+    errors = []
+    for sha1, codec in blobs:
+        path = blob_path(backups_path, sha1, codec)
+        digest = hashlib.sha1()
+        decompressor = zlib.decompressobj() if codec == "zz" else None
+        try:
+            with open(path, "rb") as f:
+                while chunk := f.read(HASH_CHUNK_SIZE):
+                    digest.update(chunk if decompressor is None else decompressor.decompress(chunk))
+            if decompressor is not None:
+                digest.update(decompressor.flush())
+        except FileNotFoundError:
+            errors.append(((sha1, codec), f"blob {sha1} is missing"))
+            continue
+        except (zlib.error, OSError) as e:
+            errors.append(((sha1, codec), f"blob {sha1}: {e}"))
+            continue
+        if digest.hexdigest() != sha1:
+            errors.append(((sha1, codec), f"blob {sha1} does not match its hash"))
+    return errors
+
+
+def _blob_references(manifest: dict):
+    blobs = {}
+    for entry in manifest["files"].values():
+        if entry.get("type") == "region":
+            chunk_size = entry["size"] // max(len(entry["chunks"]), 1)
+            for _, _, sha1 in entry["chunks"]:
+                blobs[(sha1, "raw")] = chunk_size
+        else:
+            blobs[(entry["sha1"], entry["codec"])] = entry["size"]
+    return blobs
+
+
+def _verify_snapshot(snapshot_path: Path):
+    errors = []
+    for full_path, rel_path, _ in walk_files(snapshot_path):
+        try:
+            with open(full_path, "rb") as f:
+                while f.read(HASH_CHUNK_SIZE):
+                    pass
+        except OSError as e:
+            errors.append(f"{rel_path.as_posix()}: {e}")
+    return errors
+
+
+def _batches(items, size_of, limit: int = VERIFY_BATCH_BYTES):
+    batch = []
+    total = 0
+    for item in items:
+        batch.append(item)
+        total += size_of(item)
+        if total >= limit:
+            yield batch
+            batch = []
+            total = 0
+    if batch:
+        yield batch
+
+
+def verification_tasks(backup_path: Path, backup_format: str):
+    if backup_format == "snapshot":
+        return [lambda: _verify_snapshot(backup_path)]
+    try:
+        with zipfile.ZipFile(backup_path) as zipf:
+            infos = [info for info in zipf.infolist() if not info.is_dir()]
+    except (zipfile.BadZipFile, OSError) as e:
+        return [lambda e=e: [str(e)]]
+    return [lambda batch=batch: _verify_zip_members(backup_path, [info.filename for info in batch])
+            for batch in _batches(infos, lambda info: info.file_size)]
+
+
+def run_verification(tasks: dict, workers: int = None):
+    workers = workers or default_workers()
+    errors = {key: [] for key in tasks}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [(key, pool.submit(task)) for key, key_tasks in tasks.items() for task in key_tasks]
+        for key, future in futures:
+            try:
+                errors[key].extend(future.result())
+            except Exception as e:
+                errors[key].append(str(e))
+    return errors
+
+
+def verify_backups(items: dict, backups_path: Path, workers: int = None):
+    # Incremental backups share blobs, so every blob is checked once and a
+    # bad one is reported against each backup that references it.
+    tasks = {}
+    references = {}
+    for backup_id, (backup_path, backup_format) in items.items():
+        if backup_format != "incremental":
+            tasks[backup_id] = verification_tasks(backup_path, backup_format)
+            continue
+        try:
+            references[backup_id] = _blob_references(load_manifest(backup_path))
+        except (OSError, ValueError, KeyError) as e:
+            tasks[backup_id] = [lambda e=e: [f"manifest: {e}"]]
+
+    blobs = {}
+    for refs in references.values():
+        blobs.update(refs)
+    blob_key = ("blobs",)
+    tasks[blob_key] = [lambda batch=batch: _verify_blobs(backups_path, batch)
+                       for batch in _batches(blobs, lambda blob: blobs[blob])]
+
+    errors = run_verification(tasks, workers)
+    bad_blobs = errors.pop(blob_key)
+    for backup_id, refs in references.items():
+        errors[backup_id] = []
+        for error in bad_blobs:
+            if not isinstance(error, tuple):
+                errors[backup_id].append(error)
+            elif error[0] in refs:
+                errors[backup_id].append(error[1])
+    return errors
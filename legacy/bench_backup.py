@@ -0,0 +1,74 @@
+import argparse
+import random
+import shutil
+import tempfile
+import time
+import zipfile
+import zlib
+from pathlib import Path
+
+import backups
+
+
+def make_world(root: Path, regions: int, region_size: int, small_files: int):
+    rng = random.Random(1234)
+    region_dir = root / "region"
+    region_dir.mkdir(parents=True)
+    for i in range(regions):
+        chunks = bytearray()
+        while len(chunks) < region_size:
+            # Region files hold zlib streams of fairly repetitive NBT data.
+            block = bytes(rng.choice(b"minecraft:stone,dirt,air ") for _ in range(4096)) * 8
+            chunks += zlib.compress(block)
+        (region_dir / f"r.{i}.0.mca").write_bytes(bytes(chunks[:region_size]))
+
+    data_dir = root / "data"
+    data_dir.mkdir()
+    for i in range(small_files):
+        text = " ".join(rng.choice(("player", "score", "advancement", "true", "false")) for _ in range(400))
+        (data_dir / f"file_{i}.json").write_text(text)
+
+
+def list_files(source: Path):
+    return [(full_path, rel_path, entry.stat()) for full_path, rel_path, entry in backups.walk_files(source)]
+
+
+def bench(label, file_list, destination, **kwargs):
+    start = time.perf_counter()
+    backups.write_zip(file_list, destination, **kwargs)
+    elapsed = time.perf_counter() - start
+    size = destination.stat().st_size
+    with zipfile.ZipFile(destination) as zipf:
+        assert zipf.testzip() is None
+    print(f"{label:<32} {elapsed:8.2f}s {size / 1024 / 1024:10.1f} MB")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the serial and parallel backup paths.")
+    parser.add_argument("--regions", type=int, default=64)
+    parser.add_argument("--region-size", type=int, default=4 * 1024 * 1024)
+    parser.add_argument("--small-files", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=backups.default_workers())
+    parser.add_argument("--level", type=int, default=backups.DEFAULT_COMPRESSION_LEVEL)
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="msl-bench-"))
+    try:
+        world = tmp / "world"
+        print("Generating synthetic world...")
+        make_world(world, args.regions, args.region_size, args.small_files)
+        file_list = list_files(world)
+
+        serial = bench("serial (workers=1)", file_list, tmp / "serial.zip", level=args.level, workers=1)
+        parallel = bench(f"parallel (workers={args.workers})", file_list, tmp / "parallel.zip",
+                         level=args.level, workers=args.workers)
+        bench("parallel + stored regions", file_list, tmp / "stored.zip",
+              level=args.level, workers=args.workers, store_precompressed=True)
+        print(f"Speedup: {serial / parallel:.2f}x")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
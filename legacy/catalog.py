@@ -0,0 +1,194 @@
+import re
+import sqlite3
+import time
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+CATALOG_NAME = "catalog.db"
+SCHEMA_VERSION = 2
+DATETIME_FORMAT = "%Y.%m.%d-%H:%M:%S"
+BACKUP_NAME = re.compile(r"(\d{8}-\d{6})(?:-\d+)?-world-(backup\.zip|incremental\.json|snapshot|partial)")
+FORMATS = {"backup.zip": "zip", "incremental.json": "incremental", "snapshot": "snapshot", "partial": "snapshot"}
+INFO_COLUMNS = ("version", "datetime", "format", "file", "auto", "partial", "size", "files", "sha1", "parent", "created_at",
+                "verified_at", "verify_error")
+# New IDs are 4 random bytes (8 hex characters). Older catalogs hold 2-character
+# IDs, which stay valid: IDs are only ever compared as strings.
+ID_SIZE = 4
+NEW_ID_ATTEMPTS = 100
+
+
+class CatalogError(Exception):
+    pass
+
+
+class BackupCatalog:
+    def __init__(self, backups_path: Path):
+        self.backups_path = Path(backups_path)
+        self.backups_path.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.backups_path / CATALOG_NAME, timeout=30)
+        self.db.row_factory = sqlite3.Row
+        self._migrate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def _migrate(self):
+        if self.db.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        # Two processes may open a new catalog at once. BEGIN IMMEDIATE takes
+        # the write lock first, so the second one sees the migrated version.
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            version = self.db.execute("PRAGMA user_version").fetchone()[0]
+            if version < 1:
+                self._create_schema()
+            if version < 2:
+                self.db.execute("ALTER TABLE backups ADD COLUMN verified_at REAL")
+                self.db.execute("ALTER TABLE backups ADD COLUMN verify_ok INTEGER")
+                self.db.execute("ALTER TABLE backups ADD COLUMN verify_error TEXT")
+            self.db.execute(f"PRAGMA user_version = {max(version, SCHEMA_VERSION)}")
+            self.db.commit()
+        except BaseException:
+            self.db.rollback()
+            raise
+
+    def _create_schema(self):
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS backups (
+                id TEXT PRIMARY KEY,
+                version TEXT NOT NULL DEFAULT '',
+                datetime TEXT NOT NULL DEFAULT '',
+                description TEXT NOT NULL DEFAULT '',
+                format TEXT NOT NULL DEFAULT 'zip',
+                file TEXT NOT NULL UNIQUE,
+                auto INTEGER NOT NULL DEFAULT 0,
+                partial INTEGER NOT NULL DEFAULT 0,
+                size INTEGER,
+                files INTEGER,
+                sha1 TEXT,
+                parent TEXT,
+                created_at REAL NOT NULL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS backups_by_datetime ON backups (datetime)")
+
+    def _info(self, row):
+        info = {key: row[key] for key in INFO_COLUMNS if row[key] is not None}
+        info['desc'] = row['description']
+        info['auto'] = bool(row['auto'])
+        info['partial'] = bool(row['partial'])
+        if row['verify_ok'] is not None:
+            info['verify_ok'] = bool(row['verify_ok'])
+        return info
+
+    def new_id(self, make_id):
+        # make_id(size) returns size random bytes as hex.
+        for _ in range(NEW_ID_ATTEMPTS):
+            backup_id = make_id(ID_SIZE)
+            if self.get(backup_id) is None:
+                return backup_id
+        raise CatalogError(f"Could not find a free backup ID after {NEW_ID_ATTEMPTS} attempts.")
+
+    def add(self, backup_id: str, info: dict, size: int = None, files: int = None, sha1: str = None, parent: str = None):
+        with self.db:
+            self.db.execute(
+                "INSERT INTO backups (id, version, datetime, description, format, file, auto, partial, size, files, sha1, parent, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (backup_id, info.get('version', ''), info.get('datetime', ''), info.get('desc', ''),
+                 info.get('format', 'zip'), info['file'], int(bool(info.get('auto'))), int(bool(info.get('partial'))),
+                 size, files, sha1, parent, time.time()))
+
+    def get(self, backup_id: str):
+        row = self.db.execute("SELECT * FROM backups WHERE id = ?", (backup_id,)).fetchone()
+        return self._info(row) if row is not None else None
+
+    def has_file(self, name: str):
+        return self.db.execute("SELECT 1 FROM backups WHERE file = ?", (name,)).fetchone() is not None
+
+    def all(self, backup_format: str = None, auto: bool = None, newest_first: bool = False):
+        query = "SELECT * FROM backups"
+        conditions = []
+        params = []
+        if backup_format is not None:
+            conditions.append("format = ?")
+            params.append(backup_format)
+        if auto is not None:
+            conditions.append("auto = ?")
+            params.append(int(auto))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY datetime DESC" if newest_first else " ORDER BY datetime"
+        return {row['id']: self._info(row) for row in self.db.execute(query, params)}
+
+    def remove(self, backup_ids):
+        with self.db:
+            self.db.executemany("DELETE FROM backups WHERE id = ?", [(backup_id,) for backup_id in backup_ids])
+
+    def record_verification(self, backup_id: str, ok: bool, error: str = None):
+        with self.db:
+            self.db.execute("UPDATE backups SET verified_at = ?, verify_ok = ?, verify_error = ? WHERE id = ?",
+                            (time.time(), int(ok), error, backup_id))
+
+    def unverified_since(self, timestamp: float):
+        rows = self.db.execute("SELECT * FROM backups WHERE verified_at IS NULL OR verified_at < ? "
+                               "ORDER BY verified_at IS NOT NULL, verified_at", (timestamp,))
+        return {row['id']: self._info(row) for row in rows}
+
+    def total_size(self):
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM backups").fetchone()[0]
+
+    def import_config(self, backups_cfg: dict, resolve_path):
+        imported = 0
+        for backup_id, info in backups_cfg.items():
+            path = resolve_path(info)
+            # Old configs could list two backups made in the same second
+            # that share one file. Only the first of them is kept.
+            if not path.exists() or self.get(backup_id) is not None or self.has_file(path.name):
+                continue
+            info = dict(info, file=path.name)
+            self.add(backup_id, info, size=path.stat().st_size if path.is_file() else None)
+            imported += 1
+        return imported
+
+    def reconcile(self, make_id):
+        missing = []
+        for backup_id, info in self.all().items():
+            if not (self.backups_path / info['file']).exists():
+                missing.append(backup_id)
+        self.remove(missing)
+
+        known = {row['file'] for row in self.db.execute("SELECT file FROM backups")}
+        recovered = []
+        for entry in self.backups_path.iterdir():
+            match = BACKUP_NAME.fullmatch(entry.name)
+            if match is None or entry.name in known:
+                continue
+            if entry.is_file() and entry.suffix == ".zip" and not _readable_zip(entry):
+                continue
+            created = datetime.strptime(match.group(1), "%Y%m%d-%H%M%S")
+            info = {
+                'datetime': created.strftime(DATETIME_FORMAT),
+                'desc': "Recovered by reconcile",
+                'format': FORMATS[match.group(2)],
+                'file': entry.name,
+                'partial': match.group(2) == "partial",
+            }
+            backup_id = self.new_id(make_id)
+            self.add(backup_id, info, size=entry.stat().st_size if entry.is_file() else None)
+            recovered.append(backup_id)
+        return missing, recovered
+
+
+def _readable_zip(path: Path):
+    # A backup that failed mid-write leaves a truncated or empty archive.
+    try:
+        with zipfile.ZipFile(path) as zipf:
+            return bool(zipf.namelist()) and zipf.testzip() is None
+    except (zipfile.BadZipFile, OSError):
+        return False
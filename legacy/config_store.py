@@ -0,0 +1,183 @@
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from locking import file_lock
+
+MAX_UPDATE_ATTEMPTS = 20
+
+_cache = {}
+_state = threading.local()
+
+
+class ConflictError(Exception):
+    pass
+
+
+def lock_path(path: Path) -> Path:
+    path = Path(path)
+    return path.with_name(f".{path.name}.lock")
+
+
+def _token(raw: bytes):
+    return hashlib.sha1(raw).hexdigest() if raw is not None else None
+
+
+def _read_raw(path: Path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _stat_key(path: Path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def _load(path: Path):
+    # Files are only ever replaced by rename, so a new inode, size or mtime
+    # means new content. Only cache when the file did not change mid-read.
+    key = _stat_key(path)
+    if key is None:
+        _cache.pop(path, None)
+        return None, None
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2]
+    raw = _read_raw(path)
+    if raw is None:
+        return None, None
+    data = json.loads(raw)
+    token = _token(raw)
+    if _stat_key(path) == key:
+        _cache[path] = (key, data, token)
+    return data, token
+
+
+def _pending():
+    return getattr(_state, "pending", None)
+
+
+def read_versioned(path: Path, default=None):
+    path = Path(path)
+    data, token = _load(path)
+    data = copy.deepcopy(default) if data is None else copy.deepcopy(data)
+    pending = _pending()
+    if pending is not None and path in pending:
+        for mutate in pending[path][1]:
+            mutate(data)
+    return data, token
+
+
+def read_json(path: Path, default=None):
+    return read_versioned(path, default)[0]
+
+
+def invalidate(path: Path = None):
+    if path is None:
+        _cache.clear()
+    else:
+        _cache.pop(Path(path), None)
+
+
+def _fsync_dir(folder: Path):
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_unlocked(path: Path, data):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    raw = json.dumps(data, indent=4).encode("utf-8")
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    _fsync_dir(path.parent)
+    key = _stat_key(path)
+    if key is not None:
+        _cache[path] = (key, copy.deepcopy(data), _token(raw))
+
+
+def write_json(path: Path, data):
+    with file_lock(lock_path(path)):
+        _write_unlocked(Path(path), data)
+
+
+def compare_and_swap(path: Path, token, data):
+    path = Path(path)
+    with file_lock(lock_path(path)):
+        if _token(_read_raw(path)) != token:
+            invalidate(path)
+            raise ConflictError(f"'{path}' was changed by another process.")
+        _write_unlocked(path, data)
+
+
+def _update_now(path: Path, mutate, default=None):
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        data, token = read_versioned(path, default)
+        if mutate(data) is False:
+            return data
+        try:
+            compare_and_swap(path, token, data)
+            return data
+        except ConflictError:
+            continue
+    raise ConflictError(f"Gave up updating '{path}' after {MAX_UPDATE_ATTEMPTS} conflicting writes.")
+
+
+def update(path: Path, mutate, default=None):
+    # mutate() runs without the lock held and may run again if another
+    # process wrote the file in between. It edits the data in place and
+    # returns False when nothing needs to be written.
+    path = Path(path)
+    pending = _pending()
+    if pending is None:
+        return _update_now(path, mutate, default)
+
+    data, _ = read_versioned(path, default)
+    if mutate(data) is not False:
+        pending.setdefault(path, (default, []))[1].append(mutate)
+    return data
+
+
+@contextmanager
+def batch():
+    # Updates inside the block are visible to reads in this thread right
+    # away and are written once per file when the outermost block exits.
+    if _pending() is not None:
+        yield
+        return
+    _state.pending = {}
+    try:
+        yield
+    finally:
+        pending = _state.pending
+        _state.pending = None
+        for path, (default, mutations) in pending.items():
+            _update_now(path, lambda data: any([mutate(data) is not False for mutate in mutations]), default)
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import config_store
+
+CACHE_VERSION = 1
+DEFAULT_WORKERS = 8
+
+
+def _scan_dir(path: str):
+    own = 0
+    subdirs = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif entry.is_file(follow_symlinks=False):
+                    own += entry.stat(follow_symlinks=False).st_size
+            except FileNotFoundError:
+                continue
+    return own, subdirs
+
+
+def _child(rel: str, name: str):
+    return f"{rel}/{name}" if rel else name
+
+
+def _depth(rel: str):
+    return rel.count("/") + 1 if rel else 0
+
+
+class DiskUsage:
+    def __init__(self, cache_dir: Path, max_age: float = 3600, workers: int = DEFAULT_WORKERS):
+        self.cache_dir = Path(cache_dir)
+        self.max_age = max_age
+        self.workers = workers
+
+    def _cache_path(self, root: str):
+        return self.cache_dir / f"{hashlib.sha1(root.encode('utf-8')).hexdigest()[:16]}.json"
+
+    def _visit(self, root: str, rel: str, cached: dict, now: float):
+        # A directory's mtime only changes when entries are added, removed or
+        # renamed. Files rewritten in place (like region files) keep it, so
+        # cached listings are also re-read once they are older than max_age.
+        full_path = os.path.join(root, rel) if rel else root
+        try:
+            mtime_ns = os.stat(full_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        entry = cached.get(rel)
+        if entry is not None and entry["mtime_ns"] == mtime_ns and now - entry["scanned_at"] < self.max_age:
+            return entry
+        try:
+            own, subdirs = _scan_dir(full_path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return {"mtime_ns": mtime_ns, "scanned_at": now, "files": own, "subdirs": subdirs}
+
+    def scan(self, root: Path):
+        root = str(Path(root).absolute())
+        cache_path = self._cache_path(root)
+        cache = config_store.read_json(cache_path, default={})
+        cached = cache.get("dirs", {}) if cache.get("version") == CACHE_VERSION and cache.get("root") == root else {}
+
+        now = time.time()
+        dirs = {}
+        frontier = [""]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while frontier:
+                entries = pool.map(lambda rel: self._visit(root, rel, cached, now), frontier)
+                next_frontier = []
+                for rel, entry in zip(frontier, entries):
+                    if entry is None:
+                        continue
+                    dirs[rel] = entry
+                    next_frontier.extend(_child(rel, name) for name in entry["subdirs"])
+                frontier = next_frontier
+
+        totals = {}
+        for rel in sorted(dirs, key=_depth, reverse=True):
+            totals[rel] = dirs[rel]["files"] + sum(totals.get(_child(rel, name), 0) for name in dirs[rel]["subdirs"])
+
+        if dirs != cached:
+            config_store.write_json(cache_path, {"version": CACHE_VERSION, "root": root, "dirs": dirs})
+        return totals
+
+    def size(self, root: Path):
+        return self.scan(root).get("", 0)
+
+    def breakdown(self, root: Path):
+        totals = self.scan(root)
+        top_level = {rel: size for rel, size in totals.items() if rel and "/" not in rel}
+        return totals.get("", 0), top_level
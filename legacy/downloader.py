@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+DEFAULT_SEGMENTS = 4
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 0.5
+DEFAULT_TIMEOUT = 30
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+# How much a segment downloads between writes of the .part.json offsets.
+STATE_SAVE_INTERVAL = 8 * 1024 * 1024
+
+
+class DownloadError(IOError):
+    pass
+
+
+class DownloadCancelled(Exception):
+    pass
+
+
+class Downloader:
+    def __init__(self, session=None, segments: int = DEFAULT_SEGMENTS, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF, timeout: float = DEFAULT_TIMEOUT):
+        self.session = session or requests
+        self.segments = max(1, segments)
+        self.buffer_size = buffer_size
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+    def _with_retries(self, action, description, stop: threading.Event = None):
+        attempt = 0
+        while True:
+            try:
+                return action()
+            except (requests.exceptions.RequestException, DownloadError) as e:
+                if isinstance(e, requests.exceptions.HTTPError) and e.response is not None \
+                        and e.response.status_code < 500 and e.response.status_code != 429:
+                    raise
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                delay = self.backoff * (2 ** (attempt - 1))
+                print(f"{description} failed ({e}). Retrying in {delay:.1f}s ({attempt}/{self.retries})...")
+                if stop is None:
+                    time.sleep(delay)
+                elif stop.wait(delay):
+                    raise DownloadCancelled()
+
+    def _probe(self, url):
+        response = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+        response.raise_for_status()
+        size = response.headers.get("Content-Length")
+        return {
+            "url": response.url,
+            "size": int(size) if size and size.isdigit() else None,
+            "ranges": response.headers.get("Accept-Ranges", "").lower() == "bytes",
+            "validator": response.headers.get("ETag") or response.headers.get("Last-Modified"),
+        }
+
+    def remote_sha1(self, url: str):
+        def fetch():
+            sha1 = hashlib.sha1()
+            with self.session.get(url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=self.buffer_size):
+                    sha1.update(chunk)
+            return sha1.hexdigest()
+
+        return self._with_retries(fetch, f"Hashing {url}")
+
+    def download(self, url: str, destination: Path, expected_sha1: str = None) -> str:
+        destination = Path(destination)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        part_path = destination.with_name(destination.name + ".part")
+        state_path = destination.with_name(destination.name + ".part.json")
+
+        try:
+            remote = self._with_retries(lambda: self._probe(url), f"Probing {url}")
+        except requests.exceptions.RequestException:
+            remote = {"url": url, "size": None, "ranges": False, "validator": None}
+
+        if remote["ranges"] and remote["size"]:
+            sha1 = self._download_segmented(remote, part_path, state_path)
+        else:
+            sha1 = self._with_retries(lambda: self._download_stream(remote["url"], part_path),
+                                      f"Downloading {destination.name}")
+
+        if expected_sha1 is not None and sha1 != expected_sha1:
+            part_path.unlink(missing_ok=True)
+            state_path.unlink(missing_ok=True)
+            raise ValueError(f"SHA1 mismatch for {destination.name}: Expected {expected_sha1}, got {sha1}")
+
+        os.replace(part_path, destination)
+        state_path.unlink(missing_ok=True)
+        return sha1
+
+    def _download_stream(self, url, part_path):
+        sha1 = hashlib.sha1()
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            with open(part_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=self.buffer_size):
+                    f.write(chunk)
+                    sha1.update(chunk)
+        return sha1.hexdigest()
+
+    def _load_state(self, state_path, remote):
+        try:
+            with open(state_path, "r") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if state.get("size") != remote["size"] or state.get("validator") != remote["validator"]:
+            return None
+        return state
+
+    def _download_segmented(self, remote, part_path, state_path):
+        size = remote["size"]
+        state = self._load_state(state_path, remote) if part_path.exists() else None
+        if state is None:
+            segment_size = max(MIN_SEGMENT_SIZE, -(-size // self.segments))
+            bounds = [[start, min(start + segment_size, size)] for start in range(0, size, segment_size)]
+            state = {
+                "size": size,
+                "validator": remote["validator"],
+                "segments": [{"start": start, "end": end, "done": 0} for start, end in bounds],
+            }
+            with open(part_path, "wb") as f:
+                f.truncate(size)
+        else:
+            print(f"Resuming download of {part_path.name}...")
+
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def save_state():
+            with lock:
+                tmp_path = state_path.with_name(state_path.name + ".tmp")
+                with open(tmp_path, "w") as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, state_path)
+
+        def fetch_segment(segment):
+            def attempt():
+                if stop.is_set():
+                    raise DownloadCancelled()
+                start = segment["start"] + segment["done"]
+                if start >= segment["end"]:
+                    return
+                headers = {"Range": f"bytes={start}-{segment['end'] - 1}"}
+                if remote["validator"]:
+                    headers["If-Range"] = remote["validator"]
+                with self.session.get(remote["url"], headers=headers, stream=True, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise DownloadError(f"Server ignored range request (HTTP {response.status_code})")
+                    unsaved = 0
+                    with open(part_path, "r+b") as f:
+                        f.seek(start)
+                        for chunk in response.iter_content(chunk_size=self.buffer_size):
+                            if stop.is_set():
+                                raise DownloadCancelled()
+                            chunk = chunk[:segment["end"] - segment["start"] - segment["done"]]
+                            f.write(chunk)
+                            f.flush()
+                            segment["done"] += len(chunk)
+                            unsaved += len(chunk)
+                            if unsaved >= STATE_SAVE_INTERVAL:
+                                save_state()
+                                unsaved = 0
+                if segment["start"] + segment["done"] < segment["end"]:
+                    raise DownloadError("Connection closed before the segment was complete")
+
+            self._with_retries(attempt, f"Segment {segment['start']}-{segment['end']}", stop)
+            save_state()
+
+        sha1 = hashlib.sha1()
+        pool = ThreadPoolExecutor(max_workers=self.segments)
+        interrupted = False
+        try:
+            futures = [pool.submit(fetch_segment, segment) for segment in state["segments"]]
+            with open(part_path, "rb") as f:
+                for segment, future in zip(state["segments"], futures):
+                    future.result()
+                    f.seek(segment["start"])
+                    remaining = segment["end"] - segment["start"]
+                    while remaining > 0:
+                        chunk = f.read(min(self.buffer_size, remaining))
+                        if not chunk:
+                            raise DownloadError(f"{part_path.name} is shorter than expected")
+                        sha1.update(chunk)
+                        remaining -= len(chunk)
+        except KeyboardInterrupt:
+            interrupted = True
+            raise
+        finally:
+            # Workers stop after their current chunk. On Ctrl+C they are not
+            # waited for; offsets only advance after a write, so the saved
+            # state never runs ahead of the file.
+            stop.set()
+            pool.shutdown(wait=not interrupted, cancel_futures=True)
+            save_state()
+        return sha1.hexdigest()
@@ -0,0 +1,86 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 3
+DEFAULT_POOL_SIZE = 8
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_settings = {
+    "timeout": DEFAULT_TIMEOUT,
+    "retries": DEFAULT_RETRIES,
+    "pool_size": DEFAULT_POOL_SIZE,
+}
+# Keyed by whether the adapter retries on its own.
+_adapters = {}
+_sessions = {}
+
+
+class PooledSession(requests.Session):
+    def __init__(self, adapter: HTTPAdapter, timeout: float):
+        super().__init__()
+        self.timeout = timeout
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+    def close(self):
+        # The adapter (and its connection pools) is shared with every other
+        # session from this module, so closing one session must not drop it.
+        self.adapters.clear()
+
+
+def configure(timeout: float = None, retries: int = None, pool_size: int = None):
+    with _lock:
+        for key, value in (("timeout", timeout), ("retries", retries), ("pool_size", pool_size)):
+            if value is not None:
+                _settings[key] = value
+        for adapter in _adapters.values():
+            adapter.close()
+        _adapters.clear()
+        _sessions.clear()
+
+
+def _get_adapter(retry: bool = True) -> HTTPAdapter:
+    # Callers that retry themselves (the downloader resumes segments with its
+    # own backoff) use an adapter without urllib3 retries, so the two layers
+    # do not multiply.
+    adapter = _adapters.get(retry)
+    if adapter is None:
+        if retry:
+            max_retries = Retry(
+                total=_settings["retries"],
+                backoff_factor=0.5,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset({"GET", "HEAD"}),
+                raise_on_status=False,
+            )
+        else:
+            max_retries = 0
+        adapter = HTTPAdapter(
+            pool_connections=_settings["pool_size"],
+            pool_maxsize=_settings["pool_size"],
+            pool_block=True,
+            max_retries=max_retries,
+        )
+        _adapters[retry] = adapter
+    return adapter
+
+
+def get_session(retry: bool = True) -> PooledSession:
+    with _lock:
+        if retry not in _sessions:
+            _sessions[retry] = PooledSession(_get_adapter(retry), _settings["timeout"])
+        return _sessions[retry]
+
+
+def new_session(retry: bool = True) -> PooledSession:
+    with _lock:
+        return PooledSession(_get_adapter(retry), _settings["timeout"])
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import config_store
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def stamp_path(path: Path) -> Path:
+    return Path(path).with_name(Path(path).name + ".stamp")
+
+
+def sha1_of_file(path: Path, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def _stat_key(st):
+    return {"inode": st.st_ino, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def write_stamp(path: Path, sha1: str):
+    st = Path(path).stat()
+    stamp = dict(_stat_key(st), sha1=sha1)
+    target = stamp_path(path)
+    tmp_target = target.with_name(target.name + ".tmp")
+    with open(tmp_target, "w") as f:
+        json.dump(stamp, f)
+    os.replace(tmp_target, target)
+
+
+def read_stamp(path: Path):
+    try:
+        st = Path(path).stat()
+        with open(stamp_path(path), "r") as f:
+            stamp = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if any(stamp.get(key) != value for key, value in _stat_key(st).items()):
+        return None
+    return stamp.get("sha1")
+
+
+def stamped_sha1(path: Path, verify: bool = False):
+    if not verify:
+        sha1 = read_stamp(path)
+        if sha1 is not None:
+            return sha1
+    if not Path(path).is_file():
+        return None
+    sha1 = sha1_of_file(path)
+    write_stamp(path, sha1)
+    return sha1
+
+
+class JarStore:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def blob_path(self, sha1: str) -> Path:
+        return self.root / sha1[:2] / f"{sha1}.jar"
+
+    def staging_path(self, sha1: str) -> Path:
+        return self.root / "incoming" / f"{sha1}.jar"
+
+    def incoming_path(self, key: str) -> Path:
+        return self.root / "incoming" / f"{hashlib.sha1(key.encode()).hexdigest()}.jar"
+
+    @property
+    def aliases_path(self) -> Path:
+        return self.root / "aliases.json"
+
+    def _read_aliases(self):
+        try:
+            with open(self.aliases_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def get_alias(self, key: str):
+        sha1 = self._read_aliases().get(key)
+        return sha1 if sha1 and self.has(sha1) else None
+
+    def find_alias(self, prefix: str):
+        for key, sha1 in reversed(list(self._read_aliases().items())):
+            if key.startswith(prefix) and self.has(sha1):
+                return sha1
+        return None
+
+    def set_alias(self, key: str, sha1: str):
+        def apply(aliases):
+            aliases.pop(key, None)
+            aliases[key] = sha1
+        config_store.update(self.aliases_path, apply, default={})
+
+    def has(self, sha1: str) -> bool:
+        return read_stamp(self.blob_path(sha1)) == sha1
+
+    def verify(self, sha1: str) -> bool:
+        blob = self.blob_path(sha1)
+        if not blob.is_file():
+            return False
+        if sha1_of_file(blob) == sha1:
+            write_stamp(blob, sha1)
+            return True
+        return False
+
+    def remove(self, sha1: str):
+        for path in (self.blob_path(sha1), stamp_path(self.blob_path(sha1))):
+            if path.exists():
+                path.unlink()
+
+    def add(self, src: Path, sha1: str) -> Path:
+        blob = self.blob_path(sha1)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(src, blob)
+        write_stamp(blob, sha1)
+        return blob
+
+    def is_linked(self, sha1: str, destination: Path) -> bool:
+        try:
+            return os.path.samefile(self.blob_path(sha1), destination)
+        except OSError:
+            return False
+
+    def link_into(self, sha1: str, destination: Path):
+        blob = self.blob_path(sha1)
+        destination = Path(destination)
+        if destination.exists() or destination.is_symlink():
+            destination.unlink()
+        if stamp_path(destination).exists():
+            stamp_path(destination).unlink()
+        try:
+            os.link(blob, destination)
+            return "hardlink"
+        except OSError:
+            pass
+        try:
+            os.symlink(blob, destination)
+            return "symlink"
+        except OSError:
+            shutil.copy2(blob, destination)
+            return "copy"
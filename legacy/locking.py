@@ -0,0 +1,52 @@
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+class LockBusy(Exception):
+    pass
+
+
+def acquire_lock(path: Path, blocking: bool = True):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    f = open(path, "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        elif msvcrt is not None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+    except (BlockingIOError, PermissionError, OSError) as e:
+        f.close()
+        raise LockBusy(f"'{path}' is locked by another process.") from e
+    return f
+
+
+def release_lock(f):
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        elif msvcrt is not None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        f.close()
+
+
+@contextmanager
+def file_lock(path: Path, blocking: bool = True):
+    f = acquire_lock(path, blocking)
+    try:
+        yield f
+    finally:
+        release_lock(f)
@@ -1,3 +1,4 @@
+import copy
 import hashlib
 import random
 import string
@@ -11,6 +12,8 @@ import threading
 import os
 import subprocess
 import json
+import sqlite3
+import time
 import argparse
 import zipfile
 from pathlib import Path
@@ -19,8 +22,27 @@ import requests
 from table import Table
 from modrinth_api_wrapper import Client
 import modrinth_cli
+from version_cache import VersionCache
+from jar_store import JarStore, stamped_sha1, write_stamp, sha1_of_file
+from downloader import Downloader
+import http_session
+import backups
+from rcon import RconClient, RconError
+from locking import file_lock, LockBusy
+import scheduler
+import world_select
+from catalog import BackupCatalog
+import config_store
+import migrations
+from registry import InstanceRegistry
+from disk_usage import DiskUsage
+import run_state
+import proc_identity
+import supervisor
+import metrics
 
 EMPTY_CONFIG = {
+    "config_version": migrations.CONFIG_VERSION,
     "instances_folder": str(Path.home().joinpath(".minecraft/server_instances").absolute()),
     "rp_ip": "0.0.0.0",
     "api": "",
@@ -28,16 +50,33 @@ EMPTY_CONFIG = {
     "api_password": "",
     "backup_on_rollback": True,
     "use_gui_by_default": True,
-    "launched": []
-}
-EMPTY_LAUNCHED_CONFIG = {
-    "instance": "",
-    "pid": 0,
-    "launched_at": datetime.now(timezone.utc).isoformat(),
+    "version_manifest_ttl": 3600,
+    "download_segments": 4,
+    "download_buffer_size": 1048576,
+    "download_retries": 5,
+    "http_timeout": 30,
+    "http_retries": 3,
+    "http_pool_size": 8,
+    "backup_workers": 0,
+    "backup_compression_level": 6,
+    "backup_store_regions": False,
+    "backup_region_dedup": True,
+    "scheduler_poll_interval": 60,
+    "backup_verify_interval_hours": 24,
+    "registry_size_ttl": 3600,
+    "disk_usage_max_age": 3600,
+    "supervisor_restart_delay": 5,
+    "supervisor_max_restart_delay": 300,
+    "supervisor_crash_loop_limit": 5,
+    "supervisor_stop_timeout": 60,
+    "metrics_interval": metrics.DEFAULT_INTERVAL,
+    "metrics_history": metrics.DEFAULT_HISTORY,
+    "metrics_host": "127.0.0.1",
+    "metrics_port": 9465
 }
 
 EMPTY_INSTANCE_CFG = {
-    "cfg_version": 2,
+    "cfg_version": migrations.INSTANCE_CFG_VERSION,
     "version": {
         "minecraft": "",
         "loader": {
@@ -50,6 +89,15 @@ EMPTY_INSTANCE_CFG = {
     "auto_backup": False,
     "resourcepack": "",
     "resourcepack_port": 2548,
+    "backup_mode": "full",
+    "last_launch": "",
+    "autostart": False,
+    "backup_schedule": {
+        "interval_minutes": 0,
+        "only_while_running": True,
+        "live": True,
+        "retention": scheduler.DEFAULT_RETENTION
+    },
     "backups": {
     },
     "modrinth": {}
@@ -57,8 +105,12 @@ EMPTY_INSTANCE_CFG = {
 EMPTY_BACKUP_CFG = {
     "version": "",
     "datetime": "",
-    "desc": ""
+    "desc": "",
+    "format": "zip",
+    "file": "",
+    "auto": False
 }
+BACKUP_MODES = ("full", "incremental")
 EMPTY_MODRINTH_CFG = {
     "type": "",
     "name": "",
@@ -70,30 +122,63 @@ mClient = Client()
 
 rp_httpd = None
 rp_server_thread = None
+version_cache = None
+jar_store = None
+downloader = None
+http_configured = False
+instance_registry = None
+disk_usage = None
+launch_prepare_lock = threading.Lock()
+
+def get_config_path():
+    return Path.home().joinpath(".minecraft/server_instances/config.json").absolute()
 
 def write_config(cfg):
-    config_path = Path.home().joinpath(".minecraft/server_instances/config.json").absolute()
-    config_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(config_path, 'w') as f:
-        json.dump(cfg, f, indent=4)
+    config_store.write_json(get_config_path(), cfg)
+
+def update_config(mutate):
+    def apply(cfg):
+        migrations.migrate_config(cfg, EMPTY_CONFIG)
+        return mutate(cfg)
+    return config_store.update(get_config_path(), apply, default={})
+
+def coerce_config_value(key, value):
+    # 'edit-config' passes every value as a string; store it with the type
+    # of the key's default so numeric settings keep working.
+    default = EMPTY_CONFIG.get(key)
+    if isinstance(default, bool):
+        if isinstance(value, bool):
+            return value
+        if str(value).strip().lower() in ("true", "yes", "on", "1"):
+            return True
+        if str(value).strip().lower() in ("false", "no", "off", "0"):
+            return False
+        raise ValueError(f"'{key}' must be true or false, not '{value}'.")
+    if isinstance(default, (int, float)):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        try:
+            return int(value) if isinstance(default, int) else float(value)
+        except (TypeError, ValueError):
+            pass
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"'{key}' must be a number, not '{value}'.")
+    if isinstance(default, str):
+        return str(value)
+    return value
 
 def read_config():
-    config_path = Path.home().joinpath(".minecraft/server_instances/config.json").absolute()
-
-    if config_path.exists():
-        with open(config_path, "r") as f:
-            cfg = json.load(f)
-    else:
-        cfg = {}
-
-    updated = False
-    for key, value in EMPTY_CONFIG.items():
-        if key not in cfg:
-            cfg[key] = value
-            updated = True
-    if updated:
-        write_config(cfg)
-
+    cfg = config_store.read_json(get_config_path(), default={})
+    migrations.migrate_config(cfg, EMPTY_CONFIG)
+    for key, default in EMPTY_CONFIG.items():
+        if key in cfg and type(cfg[key]) is not type(default):
+            try:
+                cfg[key] = coerce_config_value(key, cfg[key])
+            except ValueError as e:
+                print(f"Warning: {e} Using the default {default!r}.", file=sys.stderr)
+                cfg[key] = copy.deepcopy(default)
     return cfg
 
 
@@ -101,7 +186,7 @@ def upload_file(file):
     config = read_config()
     file_path = Path(file)
     if file_path.exists():
-        session = requests.Session()
+        session = get_http_session(new=True)
         print("Loging into the API...")
         api = config['api']
         api_login = config['api_login']
@@ -143,79 +228,178 @@ def generate_upload_password(n=14):
     return password
 
 
+def get_http_session(new=False, retry=True):
+    global http_configured
+    if not http_configured:
+        config = read_config()
+        http_session.configure(timeout=config['http_timeout'],
+                               retries=config['http_retries'],
+                               pool_size=config['http_pool_size'])
+        http_configured = True
+    return http_session.new_session(retry) if new else http_session.get_session(retry)
+
+def get_version_cache():
+    global version_cache
+    if version_cache is None:
+        config = read_config()
+        cache_dir = Path(config['instances_folder']) / ".cache"
+        version_cache = VersionCache(cache_dir, ttl=config['version_manifest_ttl'], session=get_http_session())
+    return version_cache
+
+def get_jar_store():
+    global jar_store
+    if jar_store is None:
+        config = read_config()
+        jar_store = JarStore(Path(config['instances_folder']) / ".cache" / "jars")
+    return jar_store
+
+def get_downloader():
+    global downloader
+    if downloader is None:
+        config = read_config()
+        downloader = Downloader(session=get_http_session(retry=False),
+                                segments=config['download_segments'],
+                                buffer_size=config['download_buffer_size'],
+                                retries=config['download_retries'])
+    return downloader
+
 def get_versions():
-    response = requests.get("https://piston-meta.mojang.com/mc/game/version_manifest_v2.json")
-    response.raise_for_status()
-    return response.json()
+    return get_version_cache().get_manifest()
 
 def get_fabric_loader_versions():
-    loader_response = requests.get("https://meta.fabricmc.net/v2/versions/loader")
+    loader_response = get_http_session().get("https://meta.fabricmc.net/v2/versions/loader")
     loader_response.raise_for_status()
     return loader_response.json()
 
 
-def get_fabric(version, loader="l",installer="l"):
+def resolve_fabric(version, loader="l", installer="l"):
     loaders = get_fabric_loader_versions()
 
-    installer_response = requests.get("https://meta.fabricmc.net/v2/versions/installer")
+    installer_response = get_http_session().get("https://meta.fabricmc.net/v2/versions/installer")
     installer_response.raise_for_status()
     installers = installer_response.json()
 
-    loader_ver=loader
-    print(f'Loader version: {loader_ver}')
-    installer_ver=None
+    print(f'Loader version: {loader}')
     if loader in ("latest", "l"):
-        loader_ver = loaders[0].get('version')
+        loader_ver = loaders[0] if loaders else None
     else:
         loader_ver = next((l for l in loaders if l.get("version") == loader), None)
-
     if loader_ver is None:
-        print(f"Fabric '{loader_ver}' not found.")
-        return None
-    if installer_response is None:
-        print(f"Fabric '{installer_ver}' not found.")
+        print(f"Fabric loader '{loader}' not found.")
         return None
 
     if installer in ("latest", "l"):
-        installer_ver = installers[0].get("version")
-    print(f"Version: {version}, Loader: {loader_ver.get('version')}, Installer: {installer_ver}")
-    url = f"https://meta.fabricmc.net/v2/versions/loader/{version}/{loader_ver.get('version')}/{installer_ver}/server/jar"
+        installer_ver = installers[0] if installers else None
+    else:
+        installer_ver = next((i for i in installers if i.get("version") == installer), None)
+    if installer_ver is None:
+        print(f"Fabric installer '{installer}' not found.")
+        return None
 
-    return url
+    if version in ("latest", "l", "snapshot", "s"):
+        version = get_version_cache().get_index().resolve(version)
+
+    print(f"Version: {version}, Loader: {loader_ver.get('version')}, Installer: {installer_ver.get('version')}")
+    return {
+        "minecraft": version,
+        "loader": loader_ver.get('version'),
+        "installer": installer_ver.get('version'),
+        "url": f"https://meta.fabricmc.net/v2/versions/loader/{version}/{loader_ver.get('version')}/{installer_ver.get('version')}/server/jar",
+    }
+
+def get_fabric(version, loader="l",installer="l"):
+    resolved = resolve_fabric(version, loader, installer)
+    return resolved['url'] if resolved else None
+
+def get_fabric_server_jar(version, loader="l", installer="l"):
+    store = get_jar_store()
+    pinned = version not in ("latest", "l", "snapshot", "s") and loader not in ("latest", "l")
+    if pinned:
+        # The trailing "/" keeps loader 0.16 from matching 0.16.1; a pinned
+        # installer makes the key complete, so that one is looked up exactly.
+        if installer in ("latest", "l"):
+            server_sha = store.find_alias(f"fabric/{version}/{loader}/")
+        else:
+            server_sha = store.get_alias(f"fabric/{version}/{loader}/{installer}")
+        if server_sha:
+            print(f"Using cached Fabric server jar for {version} (loader {loader}).")
+            return server_sha
+
+    resolved = resolve_fabric(version, loader, installer)
+    if resolved is None:
+        return None
+    key = f"fabric/{resolved['minecraft']}/{resolved['loader']}/{resolved['installer']}"
+    server_sha = store.get_alias(key)
+    if server_sha:
+        return server_sha
+
+    print(f"Downloading Fabric server jar for {resolved['minecraft']}...")
+    staging_path = store.incoming_path(key)
+    server_sha = download_server(resolved['url'], None, staging_path)
+    store.add(staging_path, server_sha)
+    store.set_alias(key, server_sha)
+    return server_sha
 
 def get_version(ver_id):
-    versions_manifest = get_versions()
-    versions = versions_manifest.get('versions')
+    cache = get_version_cache()
     print(f"Looking for version {ver_id}...")
-    if ver_id == "latest" or ver_id == "l":
-        ver_id = versions_manifest.get('latest').get("release")
-    elif ver_id == "snapshot" or ver_id == "s":
-        ver_id = versions_manifest.get('latest').get("snapshot")
+    if ver_id not in ("latest", "l", "snapshot", "s"):
+        package = cache.get_cached_package(ver_id)
+        if package is not None:
+            return package
 
-    version_entry = next((entry for entry in versions if entry.get('id') == ver_id), None)
+    index = cache.get_index()
+    ver_id = index.resolve(ver_id)
+    version_entry = index.get(ver_id)
 
     if version_entry is None:
         raise ValueError(f"Version '{ver_id}' not found.")
 
-    response = requests.get(version_entry.get('url'))
-    response.raise_for_status()
-    return response.json()
+    return cache.get_package(ver_id, version_entry.get('url'))
+
+def find_versions(prefix=None, ver_type=None, before=None, to=None):
+    index = get_version_cache().get_index()
+    if before:
+        found = index.latest_before(before, ver_type or "release")
+        return [found] if found else []
+    if to:
+        if not prefix:
+            raise ValueError("'--to' needs the start of the range in '--version'.")
+        return list(reversed(index.between(prefix, to, ver_type)))
+    if prefix:
+        return index.series(prefix, ver_type)
+    return list(reversed(index.by_type.get(ver_type, []) if ver_type else index.ordered_ids))
+
+def list_versions(prefix=None, ver_type=None, before=None, to=None):
+    try:
+        found = find_versions(prefix, ver_type, before, to)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return []
+
+    if not found:
+        print("No matching versions found.")
+        return found
+
+    index = get_version_cache().get_index()
+    title = "--- Minecraft Versions ---"
+    columns = [('ID', 25), ('Type', 12), ('Released', 25)]
+    table = Table(title, columns)
+    table.print_header()
+    for ver_id in found:
+        entry = index.by_id[ver_id]
+        table.print_row([ver_id, entry.get('type', ''), entry.get('releaseTime', '')])
+    table.print_closing()
+    return found
 
 def download_server(url, sha, destination):
-    sha1 = hashlib.sha1()
     try:
-        with requests.get(url, stream=True) as response:
-            response.raise_for_status()
-            with open(destination, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        sha1.update(chunk)
-        downloaded_sha = sha1.hexdigest()
-        if downloaded_sha != sha:
-            raise ValueError(f"SHA1 mismatch for {destination.name}: Expected {sha}, got {downloaded_sha}")
-        print(f"Download complete and SHA1 verified for {destination.name}.")
-        return True
+        downloaded_sha = get_downloader().download(url, destination, sha)
+        if sha is None:
+            print(f"Download complete for {destination.name} (SHA1 {downloaded_sha}).")
+        else:
+            print(f"Download complete and SHA1 verified for {destination.name}.")
+        return downloaded_sha
     except requests.exceptions.RequestException as e:
         raise IOError(f"Download failed for {url}: {e}")
     except Exception as e:
@@ -244,7 +428,7 @@ def check_minecraft_version(ver):
             return False
 
 
-def create_instance(name, version, memory, auto_backup=False, resourcepack="", resourcepack_port=2548, loader="vanilla", loader_version="latest"):
+def create_instance(name, version, memory, auto_backup=False, resourcepack="", resourcepack_port=2548, loader="vanilla", loader_version="latest", backup_mode="full", backup_interval=0, retention=None, autostart=False):
     config = read_config()
     instance_path = Path(config['instances_folder']).joinpath(name)
     instance_path.mkdir(parents=True, exist_ok=True)
@@ -266,6 +450,12 @@ def create_instance(name, version, memory, auto_backup=False, resourcepack="", r
     instance_cfg_data['auto_backup'] = auto_backup
     instance_cfg_data['resourcepack'] = resourcepack
     instance_cfg_data['resourcepack_port'] = resourcepack_port
+    instance_cfg_data['backup_mode'] = backup_mode if backup_mode in BACKUP_MODES else EMPTY_INSTANCE_CFG['backup_mode']
+    instance_cfg_data['autostart'] = autostart
+    instance_cfg_data['backup_schedule'] = copy.deepcopy(EMPTY_INSTANCE_CFG['backup_schedule'])
+    instance_cfg_data['backup_schedule']['interval_minutes'] = backup_interval
+    if retention is not None:
+        instance_cfg_data['backup_schedule']['retention'] = retention
     instance_cfg_data['version'] = {
         "minecraft": version,
         "loader": {
@@ -273,8 +463,7 @@ def create_instance(name, version, memory, auto_backup=False, resourcepack="", r
             "version": loader_version
             }
         }
-    with open(instance_path.joinpath("cfg.json"), "w") as cfg_file:
-        json.dump(instance_cfg_data, cfg_file, indent=4)
+    config_store.write_json(instance_path.joinpath("cfg.json"), instance_cfg_data)
 
 
     eula_path = instance_path.joinpath("eula.txt")
@@ -299,11 +488,16 @@ def create_instance(name, version, memory, auto_backup=False, resourcepack="", r
     print(f"  Version: {loader} {version}")
     print(f"  Memory: {memory}")
     print(f"  Auto-backup: {'Enabled' if auto_backup else 'Disabled'}")
+    print(f"  Backup mode: {instance_cfg_data['backup_mode']}")
+    if backup_interval:
+        print(f"  Scheduled backups: every {backup_interval} min")
+    if autostart:
+        print("  Autostart: started by the supervisor")
     if resourcepack:
         print(f"  Resource pack: '{Path(resourcepack).name}' on port {resourcepack_port}")
     return True
 
-def edit_instance(name, version=None, memory=None, auto_backup=None, resourcepack=None, resourcepack_port=None, backups=None, loader=None, loader_version=None):
+def edit_instance(name, version=None, memory=None, auto_backup=None, resourcepack=None, resourcepack_port=None, backups=None, loader=None, loader_version=None, backup_mode=None, backup_interval=None, retention=None, last_launch=None, autostart=None):
     config = read_config()
     instance_path = Path(config['instances_folder']).joinpath(name)
     instance_cfg_path = instance_path.joinpath("cfg.json")
@@ -311,72 +505,103 @@ def edit_instance(name, version=None, memory=None, auto_backup=None, resourcepac
     if not instance_cfg_path.exists():
         raise FileNotFoundError(f"Instance configuration file not found: {instance_cfg_path}")
 
-    with open(instance_cfg_path, "r") as f:
-        conf = json.load(f)
-
-    if version and check_minecraft_version(version):
-        conf['version']['minecraft'] = version
-    if memory:
-        conf['memory'] = memory
-    if auto_backup is not None:
-        conf['auto_backup'] = auto_backup
+    # Validation and network lookups happen up front: apply() may run more
+    # than once (on a write conflict or when a batch is flushed), so it only
+    # assigns values that are already known to be good.
+    new_version = version if version and check_minecraft_version(version) else None
     if resourcepack is not None:
         rp_is_link = True if resourcepack.startswith("http://") or resourcepack.startswith("https://") else False
-        if rp_is_link:
-            conf['resourcepack'] = resourcepack
-        else:
-            conf['resourcepack'] = str(Path(resourcepack).absolute()) if resourcepack else ""
-    if resourcepack_port is not None:
-        conf['resourcepack_port'] = resourcepack_port
-    if backups is not None:
-        conf['backups'] = backups
+        if not rp_is_link:
+            resourcepack = str(Path(resourcepack).absolute()) if resourcepack else ""
+    if backup_mode is not None and backup_mode not in BACKUP_MODES:
+        print(f"{backup_mode} is not a valid backup mode.")
+        backup_mode = None
+    new_loader = None
+    default_loader_version = None
     if loader is not None:
         loaders = ("vanilla", "fabric")
         if loader in loaders:
-            conf['version']['loader']['type'] = loader
+            new_loader = loader
         else:
             print(f"{loader} is not valid or supported loader.")
 
-        if conf['version']['loader']['version'] == "":
-            conf['version']['loader']['version'] = get_fabric_loader_versions()[0].get('version')
+        current = get_instance(name)
+        if current is not None and current['version']['loader']['version'] == "":
+            default_loader_version = get_fabric_loader_versions()[0].get('version')
+    new_loader_version = None
     if loader_version is not None:
         versions = get_fabric_loader_versions()
         if loader_version in ("latest", "l"):
-            conf['version']['loader']['version'] = versions[0].get("version")
+            new_loader_version = versions[0].get("version")
         else:
             for ver in versions:
                 if ver.get('version') == loader_version:
-                    conf['version']['loader']['version'] = loader_version
+                    new_loader_version = loader_version
                     break
-            print(f"{loader_version} is not valid or supported loader version.")
-    with open(instance_cfg_path, "w") as cfg_file:
-        json.dump(conf, cfg_file, indent=4)
+            else:
+                print(f"{loader_version} is not valid or supported loader version.")
+
+    def apply(conf):
+        migrations.migrate_instance_cfg(conf, EMPTY_INSTANCE_CFG)
+        if new_version:
+            conf['version']['minecraft'] = new_version
+        if memory:
+            conf['memory'] = memory
+        if auto_backup is not None:
+            conf['auto_backup'] = auto_backup
+        if resourcepack is not None:
+            conf['resourcepack'] = resourcepack
+        if resourcepack_port is not None:
+            conf['resourcepack_port'] = resourcepack_port
+        if last_launch is not None:
+            conf['last_launch'] = last_launch
+        if autostart is not None:
+            conf['autostart'] = autostart
+        if backups is not None:
+            conf['backups'] = backups
+        if backup_mode is not None:
+            conf['backup_mode'] = backup_mode
+        if backup_interval is not None or retention is not None:
+            schedule = conf.setdefault('backup_schedule', copy.deepcopy(EMPTY_INSTANCE_CFG['backup_schedule']))
+            if backup_interval is not None:
+                schedule['interval_minutes'] = backup_interval
+            if retention is not None:
+                schedule['retention'] = retention
+        if new_loader is not None:
+            conf['version']['loader']['type'] = new_loader
+        if default_loader_version and conf['version']['loader']['version'] == "":
+            conf['version']['loader']['version'] = default_loader_version
+        if new_loader_version is not None:
+            conf['version']['loader']['version'] = new_loader_version
+
+    config_store.update(instance_cfg_path, apply)
 
 def get_instance(name: str):
     cfg = read_config()
     instances_path = Path(cfg['instances_folder'])
     instance_config_path = instances_path / name / "cfg.json"
-    if instance_config_path.exists():
-        with open(instance_config_path, "r") as f:
-            instance_cfg = json.load(f)
-            if instance_cfg.get("cfg_version") is None:
-                 ver = instance_cfg["version"]
-                 instance_cfg["cfg_version"] = EMPTY_INSTANCE_CFG.get("cfg_version")
-                 if isinstance(ver, str):
-                     instance_cfg["version"] ={
-                         "minecraft": ver,
-                         "loader": {
-                             "type": "vanilla",
-                             "version": ""
-                            }
-                         }
-                 with open(instance_config_path, "w") as f2:
-                    json.dump(instance_cfg, f2, indent=4)
-            for key, default_value in EMPTY_INSTANCE_CFG.items():
-                if key not in instance_cfg:
-                    instance_cfg[key] = default_value
-            return instance_cfg
-    return None
+    instance_cfg = config_store.read_json(instance_config_path)
+    if instance_cfg is None:
+        return None
+    migrations.migrate_instance_cfg(instance_cfg, EMPTY_INSTANCE_CFG)
+    return instance_cfg
+
+def migrate_configs():
+    config = read_config()
+    targets = [(get_config_path(), migrations.migrate_config, EMPTY_CONFIG)]
+    targets += [(Path(config['instances_folder']) / name / "cfg.json", migrations.migrate_instance_cfg, EMPTY_INSTANCE_CFG)
+                for name in instance_names()]
+
+    migrated = 0
+    for path, migrate, defaults in targets:
+        current = config_store.read_json(path)
+        if current is None or not migrate(current, defaults):
+            continue
+        config_store.update(path, lambda data: migrate(data, defaults))
+        print(f"Migrated '{path}'.")
+        migrated += 1
+    print(f"{migrated} config files migrated to the current version.")
+    return True
 
 def random_hex_number(size: int=1):
     res = ""
@@ -385,27 +610,82 @@ def random_hex_number(size: int=1):
     return res
 
 def zip_with_progress(source_path: Path, destination_path: Path):
-    file_list = []
-    for root, _, files in os.walk(source_path):
-        for file in files:
-            full_path = Path(root) / file
-            rel_path = full_path.relative_to(source_path)
-            file_list.append((full_path, rel_path))
-
-    total = len(file_list)
-    if total == 0:
+    config = read_config()
+    destination = Path(str(destination_path) + '.zip')
+    # Written under a temporary name so a failed backup never leaves a
+    # truncated archive that looks like a finished one.
+    partial = destination.with_name(f".{destination.name}.tmp")
+    progress = backups.ByteProgress("Backup progress")
+    try:
+        written = backups.write_zip(backups.stream_files(source_path, progress), partial,
+                                    level=config['backup_compression_level'],
+                                    store_precompressed=config['backup_store_regions'],
+                                    workers=config['backup_workers'] or None,
+                                    progress=progress)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    if written == 0:
+        partial.unlink(missing_ok=True)
         print("No files to back up.")
-        return False
+        return 0
 
-    with zipfile.ZipFile(str(destination_path) + '.zip', 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for i, (full_path, rel_path) in enumerate(file_list, 1):
-            zipf.write(full_path, rel_path)
-            if i % max(1, total // 10) == 0 or i == total:
-                print(f"Backup progress: {i}/{total} files ({(i / total * 100):.0f}%)")
+    os.replace(partial, destination)
+    return written
 
-    return True
+def backup_file_path(instance_path: Path, backup_info: dict):
+    backups_path = instance_path / "backups"
+    if backup_info.get('file'):
+        return backups_path / backup_info['file']
+    ts = backup_info.get("datetime", "").replace(".", "").replace(":", "")
+    return backups_path / f"{ts}-world-backup.zip"
 
-def backup_instance(instance_name: str, desc: str=""):
+def open_catalog(instance_name: str):
+    config = read_config()
+    instance_path = Path(config['instances_folder']) / instance_name
+    catalog = BackupCatalog(instance_path / "backups")
+    instance_cfg = get_instance(instance_name)
+    if instance_cfg.get('backups'):
+        imported = catalog.import_config(instance_cfg['backups'], lambda info: backup_file_path(instance_path, info))
+        edit_instance(instance_name, backups={})
+        print(f"Imported {imported} backups of '{instance_name}' into the backup catalog.")
+    return catalog
+
+def latest_incremental_manifest(instance_path: Path, catalog: BackupCatalog):
+    for backup_id, info in catalog.all(backup_format="incremental", newest_first=True).items():
+        manifest_path = instance_path / "backups" / info['file']
+        if manifest_path.exists():
+            return backup_id, backups.load_manifest(manifest_path)
+    return None, None
+
+def backup_lock(instance_path: Path):
+    return file_lock(instance_path / "backups" / ".lock", blocking=False)
+
+def unique_backup_stamp(backups_path: Path, compact_timestamp: str):
+    # Names only have one-second resolution, so later backups within the
+    # same second get a counter. Callers hold backup_lock().
+    stamp = compact_timestamp
+    counter = 1
+    while any(backups_path.glob(f"{stamp}-world-*")):
+        counter += 1
+        stamp = f"{compact_timestamp}-{counter}"
+    return stamp
+
+def backup_instance(instance_name: str, desc: str="", incremental=None, source_path=None, auto=False):
+    config = read_config()
+    instance_path = Path(config['instances_folder']).joinpath(instance_name)
+    if not instance_path.is_dir():
+        print(f"Error: Instance folder '{instance_name}' not found at '{instance_path}'.")
+        return False
+
+    try:
+        with backup_lock(instance_path):
+            return _create_backup(instance_name, desc, incremental, source_path, auto)
+    except LockBusy:
+        print(f"Error: Another backup operation is already running for '{instance_name}'.")
+        return False
+
+def _create_backup(instance_name: str, desc: str="", incremental=None, source_path=None, auto=False):
     config = read_config()
     instance_path = Path(config['instances_folder']).joinpath(instance_name)
     instance_cfg = get_instance(instance_name)
@@ -414,10 +694,9 @@ def backup_instance(instance_name: str, desc: str=""):
     timestamp = datetime.now().strftime("%Y.%m.%d-%H:%M:%S")
     backup['datetime'] = timestamp
     backup['desc'] = desc
-    instance_backups = instance_cfg['backups']
-    backup_id = random_hex_number()
-    while backup_id in instance_backups:
-        backup_id = random_hex_number()
+    backup['auto'] = auto
+    if incremental is None:
+        incremental = instance_cfg.get('backup_mode') == "incremental"
 
     if not instance_path.is_dir():
         print(f"Error: Instance folder '{instance_name}' not found at '{instance_path}'.")
@@ -428,75 +707,542 @@ def backup_instance(instance_name: str, desc: str=""):
 
     world_folder = instance_path / "world"
 
-    source_path = world_folder
+    source_path = source_path or world_folder
     if not world_folder.is_dir():
         print(f"Error: 'world' folder not found for instance '{instance_name}'.")
         return False
 
-    backup_name = f"{timestamp.replace('.', '').replace(":", '')}-world-backup" if world_folder.is_dir() else f"{timestamp}-instance-backup"
+    compact_timestamp = unique_backup_stamp(backups_path, timestamp.replace('.', '').replace(':', ''))
+    if incremental:
+        return backup_instance_incremental(instance_name, instance_path, source_path, backup, compact_timestamp)
+
+    backup_name = f"{compact_timestamp}-world-backup" if world_folder.is_dir() else f"{timestamp}-instance-backup"
     destination_path = backups_path / backup_name
 
     try:
         #shutil.make_archive(str(destination_path), 'zip', str(source_path))
-        if not zip_with_progress(source_path, destination_path):
+        written = zip_with_progress(source_path, destination_path)
+        if not written:
             return False
 
         print(f"Backup created successfully: {destination_path}.zip")
-        instance_backups[backup_id] = backup
-        edit_instance(instance_name, backups=instance_backups)
+        backup['file'] = f"{backup_name}.zip"
+        archive_path = backups_path / backup['file']
+        with open_catalog(instance_name) as catalog:
+            catalog.add(catalog.new_id(random_hex_number), backup, size=archive_path.stat().st_size,
+                        files=written, sha1=sha1_of_file(archive_path))
         return True
     except Exception as e:
         print(f"Error creating backup for '{instance_name}': {e}")
         return False
 
+def rcon_configured(properties: dict):
+    return properties.get("enable-rcon") == "true" and bool(properties.get("rcon.password"))
+
+def resume_world_saving(rcon: RconClient, rcon_port: int, password: str):
+    # Never raises, so a dead connection does not hide why the snapshot
+    # failed. A server left with saving off is worse than a failed backup,
+    # hence the second try on a fresh connection.
+    try:
+        rcon.command("save-on")
+        return True
+    except (OSError, RconError) as e:
+        print(f"Warning: 'save-on' failed ({e}). Retrying on a new RCON connection...")
+    try:
+        with RconClient("127.0.0.1", rcon_port, password) as retry:
+            retry.command("save-on")
+        return True
+    except (OSError, RconError) as e:
+        print(f"Error: Could not resume world saving: {e}")
+        return False
+
+def live_backup_instance(instance_name: str, desc: str="", incremental=None, auto=False):
+    config = read_config()
+    instance_path = Path(config['instances_folder']) / instance_name
+    world_folder = instance_path / "world"
+
+    if not is_instance_running(instance_name):
+        print(f"Instance '{instance_name}' is not running. Taking a regular backup instead.")
+        return backup_instance(instance_name, desc, incremental, auto=auto)
+    if not world_folder.is_dir():
+        print(f"Error: 'world' folder not found for instance '{instance_name}'.")
+        return False
+
+    properties = read_server_properties(instance_name)
+    if not rcon_configured(properties):
+        print("Error: Live backups need RCON. Set 'enable-rcon' to true and a 'rcon.password' with 'edit-sp', then restart the server.")
+        return False
+    rcon_port = int(properties.get("rcon.port") or 25575)
+
+    staging_path = instance_path / "backups" / f".staging-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    try:
+        with backup_lock(instance_path), RconClient("127.0.0.1", rcon_port, properties["rcon.password"]) as rcon:
+            print("Pausing world saving...")
+            rcon.command("save-off")
+            paused_at = datetime.now()
+            try:
+                rcon.command("save-all flush")
+                methods = backups.snapshot_tree(world_folder, staging_path, workers=config['backup_workers'] or None)
+            finally:
+                resumed = resume_world_saving(rcon, rcon_port, properties["rcon.password"])
+            if not resumed:
+                print(f"Error: World saving of '{instance_name}' is still off. Run 'save-on' in the server console.")
+                return False
+            pause = (datetime.now() - paused_at).total_seconds()
+            print(f"World saving resumed after {pause:.1f}s ({', '.join(f'{n} {m}' for m, n in methods.items()) or 'no files'}).")
+            rcon.close()
+
+            return _create_backup(instance_name, desc, incremental, source_path=staging_path, auto=auto)
+    except LockBusy:
+        print(f"Error: Another backup operation is already running for '{instance_name}'.")
+        return False
+    except (OSError, RconError) as e:
+        print(f"Error during live backup of '{instance_name}': {e}")
+        return False
+    finally:
+        if staging_path.exists():
+            shutil.rmtree(staging_path, ignore_errors=True)
+
+def backup_instance_incremental(instance_name, instance_path, source_path, backup, compact_timestamp):
+    config = read_config()
+    backups_path = instance_path / "backups"
+    manifest_name = f"{compact_timestamp}-world-incremental.json"
+    manifest_path = backups_path / manifest_name
+
+    progress = backups.ByteProgress("Backup progress")
+
+    try:
+        catalog = open_catalog(instance_name)
+    except sqlite3.Error as e:
+        print(f"Error opening the backup catalog of '{instance_name}': {e}")
+        return False
+    try:
+        parent_id, parent = latest_incremental_manifest(instance_path, catalog)
+        stats = backups.write_incremental(source_path, backups_path, manifest_path, parent,
+                                          level=config['backup_compression_level'],
+                                          store_precompressed=config['backup_store_regions'],
+                                          workers=config['backup_workers'] or None,
+                                          region_dedup=config['backup_region_dedup'],
+                                          progress=progress)
+        if stats is None:
+            print("No files to back up.")
+            return False
+
+        print(f"Incremental backup created successfully: {manifest_path}")
+        print(f"  {stats['changed']}/{stats['files']} files changed, {stats['changed_bytes'] / 1024 / 1024:.1f} MB stored.")
+        backup['format'] = "incremental"
+        backup['file'] = manifest_name
+        catalog.add(catalog.new_id(random_hex_number), backup, size=stats['changed_bytes'], files=stats['files'],
+                    sha1=sha1_of_file(manifest_path), parent=parent_id)
+        return True
+    except Exception as e:
+        print(f"Error creating backup for '{instance_name}': {e}")
+        return False
+    finally:
+        catalog.close()
+
 def rollback_instance(instance_name: str, backup_id: str):
+    config = read_config()
+    instance_path = Path(config['instances_folder']) / instance_name
+    try:
+        with backup_lock(instance_path):
+            return _rollback_instance(instance_name, backup_id)
+    except LockBusy:
+        print(f"Error: Another backup operation is already running for '{instance_name}'.")
+        return False
+
+def _rollback_instance(instance_name: str, backup_id: str):
     config = read_config()
     instance_path = Path(config['instances_folder']) / instance_name
     instance_cfg = get_instance(instance_name)
 
-    backups = instance_cfg.get("backups", {})
-    if backup_id not in backups:
+    with open_catalog(instance_name) as catalog:
+        backup_info = catalog.get(backup_id)
+    if backup_info is None:
         print(f"Error: Backup ID '{backup_id}' not found for instance '{instance_name}'.")
         return False
+    backup_path = instance_path / "backups" / backup_info['file']
 
-    backup_info = backups[backup_id]
-    timestamp = backup_info['datetime']
-    version = backup_info['version']
+    if not backup_path.exists():
+        print(f"Error: Backup file not found at '{backup_path}'.")
+        return False
+    if is_instance_running(instance_name):
+        print(f"Error: Instance '{instance_name}' is running. Stop the server before rolling back.")
+        return False
+    if backup_info.get('partial'):
+        return _partial_rollback_instance(instance_name, backup_id, globs=("*",))
 
-    file_name_base = f"{timestamp.replace('.', '').replace(':', '')}-world-backup"
-    backup_zip_path = instance_path / "backups" / f"{file_name_base}.zip"
+    print(f"Rolling back instance '{instance_name}' using backup '{backup_id}'...")
+
+    world_folder = instance_path / "world"
+    timestamp = datetime.now().strftime("%Y.%m.%d-%H:%M:%S")
+    compact_timestamp = timestamp.replace('.', '').replace(':', '')
+    staging_path = instance_path / f".world-rollback-{compact_timestamp}"
+    workers = config['backup_workers'] or None
 
-    if not backup_zip_path.exists():
-        print(f"Error: Backup file not found at '{backup_zip_path}'.")
+    try:
+        print(f"Extracting backup '{backup_path.name}' next to the 'world' folder...")
+        if staging_path.exists():
+            shutil.rmtree(staging_path)
+        if backup_info.get('format') == "incremental":
+            manifest = backups.load_manifest(backup_path)
+            backups.restore_incremental(manifest, instance_path / "backups", staging_path, workers=workers)
+        elif backup_info.get('format') == "snapshot":
+            backups.snapshot_tree(backup_path, staging_path, workers=workers)
+        else:
+            backups.extract_zip(backup_path, staging_path, workers=workers)
+        staging_path.mkdir(exist_ok=True)
+    except Exception as e:
+        print(f"Error during extraction: {e}")
+        shutil.rmtree(staging_path, ignore_errors=True)
         return False
 
-    if config['backup_on_rollback']:
-        print(f"Creating automatic backup before rollback...")
-        if not backup_instance(instance_name, desc=f"Auto-backup before rollback to {backup_id}"):
-            print("Error: Failed to create backup before rollback. Aborting.")
-            return False
+    # The old world is moved aside instead of deleted, so the server only
+    # misses a world for the time between two renames on the same disk.
+    snapshot_name = f"{unique_backup_stamp(instance_path / 'backups', compact_timestamp)}-world-snapshot"
+    keep_snapshot = config['backup_on_rollback'] and world_folder.is_dir()
+    old_world = instance_path / "backups" / snapshot_name if keep_snapshot else instance_path / f".world-old-{compact_timestamp}"
+    try:
+        if world_folder.exists():
+            old_world.parent.mkdir(exist_ok=True)
+            os.rename(world_folder, old_world)
+        try:
+            os.rename(staging_path, world_folder)
+        except OSError:
+            if old_world.exists():
+                os.rename(old_world, world_folder)
+            raise
+    except OSError as e:
+        print(f"Error swapping in the restored world: {e}")
+        shutil.rmtree(staging_path, ignore_errors=True)
+        return False
 
-    print(f"Rolling back instance '{instance_name}' using backup '{backup_id}'...")
+    if keep_snapshot:
+        snapshot_id = record_snapshot_backup(instance_name, instance_cfg, timestamp, snapshot_name,
+                                             f"Auto-backup before rollback to {backup_id}")
+        print(f"Previous world kept as backup '{snapshot_id}'.")
+    elif old_world.exists():
+        shutil.rmtree(old_world, ignore_errors=True)
+
+    print("Rollback complete.")
+    return True
+
+def record_snapshot_backup(instance_name: str, instance_cfg: dict, timestamp: str, snapshot_name: str, desc: str, partial=False):
+    config = read_config()
+    snapshot_path = Path(config['instances_folder']) / instance_name / "backups" / snapshot_name
+    backup = EMPTY_BACKUP_CFG.copy()
+    backup['version'] = instance_cfg['version']['minecraft']
+    backup['datetime'] = timestamp
+    backup['desc'] = desc
+    backup['format'] = "snapshot"
+    backup['file'] = snapshot_name
+    backup['auto'] = True
+    backup['partial'] = partial
+    files = [entry.stat(follow_symlinks=False).st_size for _, _, entry in backups.walk_files(snapshot_path)]
+    with open_catalog(instance_name) as catalog:
+        snapshot_id = catalog.new_id(random_hex_number)
+        catalog.add(snapshot_id, backup, size=sum(files), files=len(files))
+    return snapshot_id
+
+def partial_rollback_instance(instance_name: str, backup_id: str, globs=(), dimensions=(), boxes=()):
+    config = read_config()
+    instance_path = Path(config['instances_folder']) / instance_name
+    try:
+        with backup_lock(instance_path):
+            return _partial_rollback_instance(instance_name, backup_id, globs, dimensions, boxes)
+    except LockBusy:
+        print(f"Error: Another backup operation is already running for '{instance_name}'.")
+        return False
+
+def _partial_rollback_instance(instance_name: str, backup_id: str, globs=(), dimensions=(), boxes=()):
+    config = read_config()
+    instance_path = Path(config['instances_folder']) / instance_name
+    instance_cfg = get_instance(instance_name)
+
+    with open_catalog(instance_name) as catalog:
+        backup_info = catalog.get(backup_id)
+    if backup_info is None:
+        print(f"Error: Backup ID '{backup_id}' not found for instance '{instance_name}'.")
+        return False
+    backup_path = instance_path / "backups" / backup_info['file']
+    backup_format = backup_info.get('format', "zip")
+    if not backup_path.exists():
+        print(f"Error: Backup file not found at '{backup_path}'.")
+        return False
+    if is_instance_running(instance_name):
+        print(f"Error: Instance '{instance_name}' is running. Stop the server before rolling back.")
+        return False
+
+    try:
+        boxes = [world_select.parse_box(box) for box in boxes]
+        names = backups.list_backup_members(backup_path, backup_format)
+        whole, partial = world_select.select_members(names, globs, dimensions, boxes)
+    except (world_select.SelectionError, OSError, zipfile.BadZipFile) as e:
+        print(f"Error: {e}")
+        return False
+    if not whole and not partial:
+        print(f"Nothing in backup '{backup_id}' matches the selection.")
+        return False
 
     world_folder = instance_path / "world"
-    if world_folder.exists():
+    workers = config['backup_workers'] or None
+    if config['backup_on_rollback'] and world_folder.is_dir():
+        timestamp = datetime.now().strftime("%Y.%m.%d-%H:%M:%S")
+        snapshot_name = f"{unique_backup_stamp(instance_path / 'backups', timestamp.replace('.', '').replace(':', ''))}-world-partial"
         try:
-            print("Deleting existing world folder...")
-            shutil.rmtree(world_folder)
-        except Exception as e:
-            print(f"Error removing old world folder: {e}")
+            saved = backups.snapshot_files(world_folder, whole + list(partial), instance_path / "backups" / snapshot_name, workers=workers)
+        except OSError as e:
+            print(f"Error: Failed to save the files being replaced: {e}. Aborting.")
             return False
+        if saved:
+            snapshot_id = record_snapshot_backup(instance_name, instance_cfg, timestamp, snapshot_name,
+                                                 f"Auto-backup before partial rollback to {backup_id}", partial=True)
+            print(f"Replaced files kept as backup '{snapshot_id}'.")
 
+    print(f"Restoring {len(whole)} files and chunks in {len(partial)} region files from backup '{backup_id}'...")
     try:
-        print(f"Extracting backup '{backup_zip_path.name}' into 'world' folder...")
-        world_folder.mkdir(exist_ok=True)
-        with zipfile.ZipFile(backup_zip_path, 'r') as zip_ref:
-            zip_ref.extractall(world_folder)
-        print("Rollback complete.")
-        return True
+        backups.restore_members(backup_path, backup_format, instance_path / "backups", world_folder,
+                                whole, partial, workers=workers)
     except Exception as e:
-        print(f"Error during extraction: {e}")
+        print(f"Error during partial rollback: {e}")
+        return False
+    print("Partial rollback complete.")
+    return True
+
+def remove_backup(instance_name: str, backup_id: str):
+    config = read_config()
+    instance_path = Path(config['instances_folder']) / instance_name
+    try:
+        with backup_lock(instance_path):
+            return _remove_backups(instance_name, [backup_id])
+    except LockBusy:
+        print(f"Error: Another backup operation is already running for '{instance_name}'.")
+        return False
+
+def _remove_backups(instance_name: str, backup_ids):
+    config = read_config()
+    instance_path = Path(config['instances_folder']) / instance_name
+    catalog = open_catalog(instance_name)
+    try:
+        removed_infos = [catalog.get(backup_id) for backup_id in backup_ids]
+        missing = [backup_id for backup_id, info in zip(backup_ids, removed_infos) if info is None]
+        if missing:
+            print(f"Error: Backup ID '{missing[0]}' not found for instance '{instance_name}'.")
+            return False
+
+        for backup_id, backup_info in zip(backup_ids, removed_infos):
+            backup_path = instance_path / "backups" / backup_info['file']
+            if backup_path.is_dir():
+                shutil.rmtree(backup_path)
+            elif backup_path.exists():
+                backup_path.unlink()
+            catalog.remove([backup_id])
+            print(f"Backup '{backup_id}' ({backup_info.get('datetime', '')}) removed.")
+
+        if any(info.get('format') == "incremental" for info in removed_infos):
+            manifests = []
+            for info in catalog.all(backup_format="incremental").values():
+                manifest_path = instance_path / "backups" / info['file']
+                if manifest_path.exists():
+                    manifests.append(backups.load_manifest(manifest_path))
+            removed, freed = backups.collect_garbage(instance_path / "backups", manifests)
+            print(f"Removed {removed} unreferenced blobs ({freed / 1024 / 1024:.1f} MB freed).")
+        return True
+    except OSError as e:
+        print(f"Error removing backups: {e}")
         return False
+    finally:
+        catalog.close()
+
+def prune_backups(instance_name: str):
+    config = read_config()
+    instance_path = Path(config['instances_folder']) / instance_name
+    try:
+        with backup_lock(instance_path):
+            return _prune_backups(instance_name)
+    except LockBusy:
+        print(f"Error: Another backup operation is already running for '{instance_name}'.")
+        return False
+
+def _prune_backups(instance_name: str):
+    config = read_config()
+    instance_path = Path(config['instances_folder']) / instance_name
+    instance_cfg = get_instance(instance_name)
+    policy = dict(scheduler.DEFAULT_RETENTION, **instance_cfg.get('backup_schedule', {}).get('retention', {}))
+    with open_catalog(instance_name) as catalog:
+        auto_backups = catalog.all(auto=True)
+
+    keep = scheduler.select_retained(auto_backups, policy)
+    expired = [backup_id for backup_id in auto_backups if backup_id not in keep]
+    if expired:
+        print(f"Pruning {len(expired)} expired backups of '{instance_name}'...")
+        if not _remove_backups(instance_name, expired):
+            return False
+
+    max_disk = policy.get('max_disk_mb', 0) * 1024 * 1024
+    if max_disk > 0:
+        while True:
+            used = get_disk_usage().size(instance_path / "backups")
+            with open_catalog(instance_name) as catalog:
+                dated = list(catalog.all(auto=True).items())
+            if used <= max_disk:
+                break
+            if len(dated) <= 1:
+                print(f"Warning: Backups of '{instance_name}' use {used / 1024 / 1024:.1f} MB, over the {max_disk / 1024 / 1024:.0f} MB cap, "
+                      "but only manual or the newest automatic backups are left.")
+                break
+            print(f"Backups use {used / 1024 / 1024:.1f} MB, over the {max_disk / 1024 / 1024:.0f} MB cap. Removing the oldest automatic backup...")
+            if not _remove_backups(instance_name, [dated[0][0]]):
+                return False
+    return True
+
+def verify_backups(instance_name: str, backup_id: str = None, max_age_hours: float = None):
+    config = read_config()
+    instance_path = Path(config['instances_folder']) / instance_name
+    try:
+        with backup_lock(instance_path):
+            return _verify_backups(instance_name, backup_id, max_age_hours)
+    except LockBusy:
+        print(f"Error: Another backup operation is already running for '{instance_name}'.")
+        return False
+
+def _verify_backups(instance_name: str, backup_id: str = None, max_age_hours: float = None):
+    config = read_config()
+    backups_path = Path(config['instances_folder']) / instance_name / "backups"
+
+    with open_catalog(instance_name) as catalog:
+        if backup_id is not None:
+            info = catalog.get(backup_id)
+            if info is None:
+                print(f"Error: Backup ID '{backup_id}' not found for instance '{instance_name}'.")
+                return False
+            selected = {backup_id: info}
+        elif max_age_hours is not None:
+            selected = catalog.unverified_since(time.time() - max_age_hours * 3600)
+        else:
+            selected = catalog.all()
+        if not selected:
+            return True
+
+        print(f"Verifying {len(selected)} backups of '{instance_name}'...")
+        items = {}
+        problems = {}
+        for selected_id, info in selected.items():
+            backup_path = backups_path / info['file']
+            if not backup_path.exists():
+                problems[selected_id] = ["backup file is missing"]
+            elif info.get('format') == "incremental" and info.get('sha1') and sha1_of_file(backup_path) != info['sha1']:
+                problems[selected_id] = ["manifest does not match its recorded SHA-1"]
+            else:
+                items[selected_id] = (backup_path, info.get('format', "zip"))
+
+        for selected_id, errors in backups.verify_backups(items, backups_path, workers=config['backup_workers'] or None).items():
+            problems.setdefault(selected_id, []).extend(errors)
+
+        all_ok = True
+        for selected_id, info in selected.items():
+            errors = problems.get(selected_id, [])
+            catalog.record_verification(selected_id, not errors, "; ".join(errors[:5]) or None)
+            if errors:
+                all_ok = False
+                print(f"  {selected_id} ({info.get('datetime', '')}): CORRUPT")
+                for error in errors[:5]:
+                    print(f"    {error}")
+                if len(errors) > 5:
+                    print(f"    ... and {len(errors) - 5} more problems")
+            else:
+                print(f"  {selected_id} ({info.get('datetime', '')}): OK")
+    return all_ok
+
+def get_disk_usage():
+    global disk_usage
+    if disk_usage is None:
+        config = read_config()
+        disk_usage = DiskUsage(Path(config['instances_folder']) / ".cache" / "disk_usage",
+                               max_age=config['disk_usage_max_age'])
+    return disk_usage
+
+def instance_disk_usage(instance_path: Path):
+    total, top_level = get_disk_usage().breakdown(instance_path)
+    return {
+        "size": total,
+        "world_size": top_level.get("world", 0),
+        "backups_size": top_level.get("backups", 0),
+    }
+
+def get_instance_registry():
+    global instance_registry
+    if instance_registry is None:
+        config = read_config()
+        instances_path = Path(config['instances_folder'])
+        instance_registry = InstanceRegistry(instances_path, instances_path / ".cache" / "registry.json",
+                                             get_instance, measure=instance_disk_usage,
+                                             size_ttl=config['registry_size_ttl'])
+    return instance_registry
+
+def show_disk_usage(instance_name: str = None, as_json=False):
+    config = read_config()
+    names = [instance_name] if instance_name else instance_names()
+    rows = []
+    for name in names:
+        instance_path = Path(config['instances_folder']) / name
+        total, top_level = get_disk_usage().breakdown(instance_path)
+        world = top_level.get("world", 0)
+        backups_size = top_level.get("backups", 0)
+        rows.append({"name": name, "world": world, "backups": backups_size,
+                     "other": total - world - backups_size, "total": total})
+
+    if as_json:
+        print(json.dumps(rows, indent=4))
+        return rows
+    if not rows:
+        print("No Minecraft server instances found.")
+        return rows
+
+    table = Table("--- Disk usage ---", [('Name', 20), ('World', 10), ('Backups', 10), ('Other', 10), ('Total', 10)])
+    table.print_header()
+    for row in rows:
+        table.print_row([row['name']] + [backups.format_bytes(row[key]) for key in ("world", "backups", "other", "total")])
+    table.print_row(["(all)"] + [backups.format_bytes(sum(row[key] for row in rows)) for key in ("world", "backups", "other", "total")])
+    table.print_closing()
+    return rows
+
+def instance_names():
+    return get_instance_registry().names()
+
+def is_instance_running(instance_name: str):
+    config = read_config()
+    return run_state.running_info(Path(config['instances_folder']) / instance_name) is not None
+
+def run_backup_scheduler():
+    config = read_config()
+
+    def get_schedule(name):
+        return get_instance(name).get('backup_schedule')
+
+    def get_backups(name):
+        with open_catalog(name) as catalog:
+            return catalog.all()
+
+    def run_backup(name, schedule):
+        if schedule.get('live', True) and is_instance_running(name):
+            if rcon_configured(read_server_properties(name)):
+                return live_backup_instance(name, "Scheduled backup", auto=True)
+            # A regular backup of a running world may catch a chunk mid-save,
+            # which still beats taking no backup at all.
+            print(f"Warning: RCON is not set up for '{name}', so the scheduled backup cannot pause world saving. "
+                  "Taking a regular backup. Set 'enable-rcon' and 'rcon.password' with 'edit-sp' for live backups.")
+        return backup_instance(name, "Scheduled backup", auto=True)
+
+    def verify(name):
+        verify_backups(name, max_age_hours=config['backup_verify_interval_hours'])
+
+    backup_scheduler = scheduler.BackupScheduler(instance_names, get_schedule, get_backups, is_instance_running,
+                                                 run_backup, prune_backups,
+                                                 poll_interval=config['scheduler_poll_interval'],
+                                                 verify=verify if config['backup_verify_interval_hours'] > 0 else None,
+                                                 verify_interval=config['backup_verify_interval_hours'] * 3600)
+    backup_scheduler.run_forever()
 
 
 def delete_instance(name: str):
@@ -557,15 +1303,9 @@ def calculate_file_sha1(file_path: str):
     except Exception as e:
         print(f"Error calculating SHA1 for '{file_path}': {e}")
         return None
-def calculate_remote_file_sha1(url: str, chunk_size: int=8192):
-    sha1_hash = hashlib.sha1()
+def calculate_remote_file_sha1(url: str):
     try:
-        with requests.get(url, stream=True) as r:
-            r.raise_for_status()
-            for chunk in r.iter_content(chunk_size=chunk_size):
-                if chunk:
-                    sha1_hash.update(chunk)
-        return sha1_hash.hexdigest()
+        return get_downloader().remote_sha1(url)
     except requests.exceptions.RequestException as e:
         print(f"Error downloading file from {url}: {e}")
         return None
@@ -573,6 +1313,21 @@ def calculate_remote_file_sha1(url: str, chunk_size: int=8192):
         print(f"An unexpected error occurred: {e}")
         return None
 
+def read_server_properties(instance_name: str):
+    config = read_config()
+    server_properties_path = Path(config['instances_folder']).joinpath(f"{instance_name}/server.properties")
+    properties = {}
+    if not server_properties_path.exists():
+        return properties
+
+    with open(server_properties_path, "r") as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped and '=' in stripped and not stripped.startswith('#'):
+                k, v = stripped.split('=', 1)
+                properties[k.strip()] = v.strip()
+    return properties
+
 def update_server_properties(instance_name: str, key: str, value):
     config = read_config()
 
@@ -703,11 +1458,6 @@ def set_resourcepack(instance_name: str):
         print(f"Resource pack '{rp_path.name}' attached to instance '{instance_name}'.")
         print(f"Minecraft clients will attempt to download it from: {rp_url}")
 
-        print(f"Starting local HTTP server for resource pack: {rp_path.name}")
-        if not start_resourcepack_http_server(rp_path, rp_ip, instance_cfg['resourcepack_port']):
-            print(
-                "Failed to start resource pack HTTP server. Server might not function correctly regarding resource packs.")
-
     update_server_properties(instance_name, "resource-pack", rp_url)
     if rp_sha1:
         update_server_properties(instance_name, "resource-pack-sha1", rp_sha1)
@@ -719,7 +1469,6 @@ def set_resourcepack(instance_name: str):
 
 
 def attach_resourcepack(instance_name: str, resourcepack_value: str, resourcepack_port: str=None):
-    config = read_config()
     instance_cfg = get_instance(instance_name)
 
     if not instance_cfg:
@@ -741,68 +1490,131 @@ def attach_resourcepack(instance_name: str, resourcepack_value: str, resourcepac
     print("Resource pack information attached to '" + instance_name + "' successfully.")
     return True
 
-def launch_server(instance_name: str, no_gui=False):
+def prepare_launch(instance_name: str, verify=False, skip_backup=False):
     config = read_config()
     instance = get_instance(instance_name)
     if not instance:
         print(f"Instance '{instance_name}' not found.")
-        return
+        return None
 
     instance_path = Path(config['instances_folder']) / instance_name
     server_jar_path = instance_path / f"server.jar"
 
     try:
-        if instance.get('auto_backup', False):
+        if instance.get('auto_backup', False) and not skip_backup:
             print(f"Auto-backup enabled. Creating backup for '{instance_name}' before launch...")
-            if not backup_instance(instance_name, "Auto-backup"):
+            if not backup_instance(instance_name, "Auto-backup", auto=True):
                 print("Auto-backup failed. Continuing with server launch anyway.")
             else:
                 print("Auto-backup completed.")
 
-        ver = get_version(instance['version']['minecraft'])
-        server_jar_url = ver.get('downloads', {}).get('server', {}).get('url')
-        server_sha = ver.get('downloads', {}).get('server', {}).get('sha1')
-        match instance['version']['loader']['type']:
-            case "vanilla":
-                server_jar_url = ver.get('downloads', {}).get('server', {}).get('url')
-                server_sha = ver.get('downloads', {}).get('server', {}).get('sha1')
-            case "fabric":
-                server_jar_url = get_fabric(version=instance['version']['minecraft'], loader=instance['version']['loader']['version'])
-                server_sha = calculate_remote_file_sha1(server_jar_url)
-
-        if not server_jar_url or not server_sha:
-            print("Server download information missing from version manifest.")
-            return
-
-        current_sha1 = None
-        if server_jar_path.exists():
-            print("Checking existing server.jar SHA1...")
-            current_sha1 = calculate_file_sha1(server_jar_path)
-
-        if not server_jar_path.exists() or current_sha1 != server_sha:
-            print(f"server.jar not found or SHA1 mismatch. Downloading server.jar for {get_version_name_download(instance.get('version').get('minecraft'))}...")
-            download_server(server_jar_url, server_sha, server_jar_path)
-        else:
-            print("server.jar is up to date.")
+        # The supervisor prepares several instances at once. They share jar
+        # store blobs and staging files, so only one links or downloads at a time.
+        with launch_prepare_lock:
+            store = get_jar_store()
+            server_jar_url = None
+            server_sha = None
+            match instance['version']['loader']['type']:
+                case "vanilla":
+                    ver = get_version(instance['version']['minecraft'])
+                    server_jar_url = ver.get('downloads', {}).get('server', {}).get('url')
+                    server_sha = ver.get('downloads', {}).get('server', {}).get('sha1')
+                case "fabric":
+                    server_sha = get_fabric_server_jar(instance['version']['minecraft'], instance['version']['loader']['version'])
+                    if server_sha and verify and not store.verify(server_sha):
+                        print("Stored Fabric server jar failed verification. It will be downloaded again.")
+                        store.remove(server_sha)
+                        server_sha = get_fabric_server_jar(instance['version']['minecraft'], instance['version']['loader']['version'])
+
+            if not server_sha or not (server_jar_url or store.has(server_sha)):
+                print("Server download information missing from version manifest.")
+                return None
+
+            if verify and server_jar_url and store.has(server_sha):
+                print("Verifying server.jar in jar store...")
+                if not store.verify(server_sha):
+                    print("Stored server.jar failed verification. It will be downloaded again.")
+                    store.remove(server_sha)
+            if not store.has(server_sha):
+                print(f"server.jar not found in jar store. Downloading server.jar for {get_version_name_download(instance.get('version').get('minecraft'))}...")
+                staging_path = store.staging_path(server_sha)
+                download_server(server_jar_url, server_sha, staging_path)
+                store.add(staging_path, server_sha)
+
+            if store.is_linked(server_sha, server_jar_path):
+                print("server.jar is up to date.")
+            elif stamped_sha1(server_jar_path, verify) == server_sha:
+                print("server.jar is up to date.")
+            else:
+                link_type = store.link_into(server_sha, server_jar_path)
+                if link_type == "copy":
+                    write_stamp(server_jar_path, server_sha)
+                print(f"Linked server.jar from jar store ({link_type}).")
         set_resourcepack(instance_name)
 
         java_exec = "java"
-
         memory_allocation = instance.get('memory', EMPTY_INSTANCE_CFG['memory'])
-
         command = [java_exec, f"-Xmx{memory_allocation}", f"-Xms{memory_allocation}", "-jar", str(server_jar_path)]
+
         respack = instance.get('resourcepack', '')
         needs_hosting = bool(respack) and not (respack.startswith("http://") or respack.startswith("https://"))
-        print(f"Launching server with command: {' '.join(command)}")
-        use_gui_by_default = config.get("use_gui_by_default", True)
-        use_gui = use_gui_by_default ^ no_gui
+        resourcepack = (str(Path(respack).parent.absolute()), instance['resourcepack_port']) if needs_hosting else None
+        return {"command": command, "cwd": str(instance_path), "resourcepack": resourcepack}
+
+    except requests.exceptions.RequestException as e:
+        print(f"Network error during server launch (e.g., getting version info, downloading JAR): {e}")
+    except ValueError as e:
+        print(f"Configuration or version error: {e}")
+    except IOError as e:
+        print(f"File system error during server launch: {e}")
+    except Exception as e:
+        print(f"An unexpected error occurred during server launch: {e}")
+    return None
 
-        print(f"Use Gui: {use_gui}")
-        print(f"Needs hosting: {needs_hosting}")
+def record_launch(instance_name: str, launched_at: str):
+    edit_instance(instance_name, last_launch=launched_at)
+
+def launch_server(instance_name: str, no_gui=False, verify=False):
+    config = read_config()
+    instance_path = Path(config['instances_folder']) / instance_name
+    if is_instance_running(instance_name):
+        print(f"Error: Instance '{instance_name}' is already running.")
+        return
+
+    launch = prepare_launch(instance_name, verify)
+    if launch is None:
+        return
+    command = launch['command']
+    needs_hosting = launch['resourcepack'] is not None
+    print(f"Launching server with command: {' '.join(command)}")
+    use_gui_by_default = config.get("use_gui_by_default", True)
+    use_gui = use_gui_by_default ^ no_gui
+
+    print(f"Use Gui: {use_gui}")
+    print(f"Needs hosting: {needs_hosting}")
+
+    launched_at = datetime.now(timezone.utc).isoformat()
+    info = {"instance": instance_name, "launched_at": launched_at}
+    try:
+        lock = run_state.claim(instance_path, info)
+    except LockBusy:
+        print(f"Error: Instance '{instance_name}' is already running.")
+        return
+
+    try:
+        if needs_hosting:
+            print(f"Starting local HTTP server for resource pack from '{launch['resourcepack'][0]}'")
+            if not start_resourcepack_http_server(get_instance(instance_name)['resourcepack'], config['rp_ip'], launch['resourcepack'][1]):
+                print(
+                    "Failed to start resource pack HTTP server. Server might not function correctly regarding resource packs.")
 
         if needs_hosting or not use_gui:
             command.append("nogui")
-            server_process = subprocess.run(command, cwd=instance_path)
+            server_process = subprocess.Popen(command, cwd=instance_path, pass_fds=run_state.inheritable(lock))
+            run_state.record_process(lock, info, server_process.pid)
+            lock = run_state.hand_over(lock)
+            record_launch(instance_name, launched_at)
+            server_process.wait()
 
             print(f"Server '{instance_name}' exited with code {server_process.returncode}.")
         else:
@@ -812,95 +1624,88 @@ def launch_server(instance_name: str, no_gui=False):
                 stdout=subprocess.DEVNULL,
                 stderr=subprocess.DEVNULL,
                 stdin=subprocess.DEVNULL,
-                start_new_session=True
+                start_new_session=True,
+                pass_fds=run_state.inheritable(lock)
             )
+            run_state.record_process(lock, info, process.pid)
+            lock = run_state.hand_over(lock)
+            record_launch(instance_name, launched_at)
+            print(f"Server process started with PID {process.pid}.")
 
-            def server():
-                print(f"Server process started with PID {process.pid}.")
-                process.wait()
-                print(f"Server '{instance_name}' exited with code {process.returncode}.")
-
-            threading.Thread(target=server, daemon=True).start()
-
-    except requests.exceptions.RequestException as e:
-        print(f"Network error during server launch (e.g., getting version info, downloading JAR): {e}")
-    except ValueError as e:
-        print(f"Configuration or version error: {e}")
     except FileNotFoundError:
-        print(f"Error: Java executable '{java_exec}' not found. Please ensure Java is installed and in your PATH.")
+        print(f"Error: Java executable '{command[0]}' not found. Please ensure Java is installed and in your PATH.")
     except IOError as e:
         print(f"File system error during server launch: {e}")
     except Exception as e:
         print(f"An unexpected error occurred during server launch: {e}")
     finally:
+        run_state.release(lock)
         stop_resourcepack_http_server()
 
-def list_backups(instance_name: str):
-    instance_cfg = get_instance(instance_name)
-    instance_path = Path(read_config()['instances_folder']) / instance_name
-    backups_path = instance_path / "backups"
+def list_backups(instance_name: str, as_json=False):
+    with open_catalog(instance_name) as catalog:
+        backups_list = catalog.all()
 
-    backups = instance_cfg.get("backups", {})
-
-    if not backups:
+    if as_json:
+        print(json.dumps([dict(info, id=backup_id) for backup_id, info in backups_list.items()], indent=4))
+        return
+    if not backups_list:
         print(f"\nNo backups found for instance '{instance_name}'.")
         return
 
     title = f"--- Backups for {instance_name} ---"
-    columns = [('ID',10),('Date/Time',20),('Version',10),('Description',40)]
+    columns = [('ID',10),('Date/Time',20),('Version',10),('Format',12),('Size',10),('Verified',8),('Description',40)]
     table = Table(title, columns)
 
     table.print_header()
-    removed = []
-    for backup_id, info in backups.items():
-        ts = info.get("datetime", "").replace(".", "").replace(":", "")
-        backup_name = f"{ts}-world-backup.zip"
-        backup_file = backups_path / backup_name
-
-        if not backup_file.exists():
-            print(f"Missing backup {backup_id} ({backup_name}), removing from config...")
-            removed.append(backup_id)
-            continue
-
-        desc = info.get("desc", "")
-        table.print_row([backup_id, info.get('datetime', ''),info.get('version', ''), desc])
-    if removed:
-        for bid in removed:
-            backups.pop(bid, None)
-        edit_instance(instance_name, backups=backups)
+    for backup_id, info in backups_list.items():
+        size = backups.format_bytes(info['size']) if 'size' in info else "?"
+        verified = "-" if 'verify_ok' not in info else ("ok" if info['verify_ok'] else "FAILED")
+        table.print_row([backup_id, info.get('datetime', ''), info.get('version', ''), info.get('format', 'zip'), size, verified, info.get('desc', '')])
 
     table.print_closing()
 
+def reconcile_backups(instance_name: str):
+    config = read_config()
+    instance_path = Path(config['instances_folder']) / instance_name
+    try:
+        with backup_lock(instance_path), open_catalog(instance_name) as catalog:
+            missing, recovered = catalog.reconcile(random_hex_number)
+    except LockBusy:
+        print(f"Error: Another backup operation is already running for '{instance_name}'.")
+        return False
+    for backup_id in missing:
+        print(f"Backup '{backup_id}' is missing from disk and was removed from the catalog.")
+    for backup_id in recovered:
+        print(f"Found untracked backup, added to the catalog as '{backup_id}'.")
+    print(f"Catalog of '{instance_name}' reconciled: {len(missing)} removed, {len(recovered)} recovered.")
+    return True
+
 
-def list_instances():
+def list_instances(as_json=False):
     config = read_config()
-    instances_path = Path(config['instances_folder'])
-    instances_path.mkdir(parents=True, exist_ok=True)
-
-    found_instances = []
-    for instance_dir in instances_path.iterdir():
-        if instance_dir.is_dir():
-            cfg_file = instance_dir / "cfg.json"
-            if cfg_file.exists():
-                try:
-                    inst = get_instance(instance_dir.name)
-                    found_instances.append({
-                        "name": instance_dir.name,
-                        "instance": inst,
-                    })
-                except json.JSONDecodeError:
-                    print(f"Warning: Could not read cfg.json for instance '{instance_dir.name}'. Skipping.")
-                except Exception as e:
-                    print(f"Warning: An error occurred while processing instance '{instance_dir.name}': {e}. Skipping.")
-
-    if found_instances:
+    Path(config['instances_folder']).mkdir(parents=True, exist_ok=True)
+
+    found_instances, errors = get_instance_registry().scan()
+    for name, error in errors.items():
+        if isinstance(error, json.JSONDecodeError):
+            print(f"Warning: Could not read cfg.json for instance '{name}'. Skipping.", file=sys.stderr)
+        else:
+            print(f"Warning: An error occurred while processing instance '{name}': {error}. Skipping.", file=sys.stderr)
+
+    if as_json:
+        print(json.dumps([{key: value for key, value in instance.items() if key != "key"} for instance in found_instances], indent=4))
+    elif found_instances:
         title = "--- Available Minecraft Server Instances ---"
-        columns =[('Name', 20),('Loader', 15),('Version', 20),('Memory', 10)]
+        columns =[('Name', 20),('Loader', 10),('Version', 16),('Memory', 8),('World', 10),('Backups', 10),('Last launch', 19)]
         table = Table(title, columns)
 
         table.print_header()
         for instance in found_instances:
-            table.print_row([instance['name'], instance['instance']['version']['loader']['type'],get_version_name_download(instance['instance']['version']['minecraft']), instance['instance']['memory']])
+            world = backups.format_bytes(instance['world_size']) if instance.get('world_size') is not None else "?"
+            backups_size = backups.format_bytes(instance['backups_size']) if instance.get('backups_size') is not None else "?"
+            last_launch = instance['last_launch'][:19].replace("T", " ") if instance.get('last_launch') else "never"
+            table.print_row([instance['name'], instance['loader'], get_version_name_download(instance['version']), instance['memory'], world, backups_size, last_launch])
         table.print_closing()
     else:
         print("No Minecraft server instances found.")
@@ -922,62 +1727,171 @@ def edit_global_config(key=None, value=None):
         if key not in current_config:
             print(f"Warning: Key '{key}' not found in current config. Skipping.")
         else:
-            current_config[key] = value
+            try:
+                value = coerce_config_value(key, value)
+            except ValueError as e:
+                print(f"Error: {e}")
+                return
+            def set_value(cfg):
+                cfg[key] = value
+            update_config(set_value)
             updated = True
 
     if updated:
-        write_config(current_config)
         print("Global configuration updated successfully.")
     else:
         print("No global configuration settings provided to update.")
 
-def add_launched(instance: str, pid: int):
-    cfg = read_config()
-    entry = EMPTY_LAUNCHED_CONFIG.copy()
-    entry['pid'] = pid
-    entry['instance'] = instance
-    cfg['launched'].append(entry)
-    write_config(cfg)
+def get_supervisor_state_path():
+    return Path(read_config()['instances_folder']) / ".cache" / "supervisor.json"
 
+def supervisor_request(action: str, **fields):
+    return supervisor.send_request(get_supervisor_state_path(), action, **fields)
 
-def check_launched():
-    cfg = read_config()
-    alive = []
-    updated = False
+def running_records():
+    config = read_config()
+    instances_path = Path(config['instances_folder'])
+    running = run_state.running_all([instances_path / name for name in instance_names()])
+    return {path.name: info for path, info in running.items()}
 
-    for entry in cfg['launched']:
-        pid = entry['pid']
-        try:
-            proc = psutil.Process(pid)
-            if proc.is_running() and proc.status() != psutil.STATUS_ZOMBIE:
-                alive.append(entry)
-            else:
-                updated = True
-        except psutil.NoSuchProcess:
-            updated = True
-    if updated:
-        cfg['launched'] = alive
-        write_config(cfg)
-    return alive
+def make_metrics_collector():
+    config = read_config()
+    return metrics.MetricsCollector(running_records, interval=config['metrics_interval'], history=config['metrics_history'])
 
-def remove_launched(pid: int):
-    cfg = read_config()
-    before = len(cfg['launched'])
-    cfg['launched'] = [e for e in cfg['launched'] if e['pid'] != pid ]
-    if len(cfg['launched']) != before:
-        write_config(cfg)
+def run_supervisor():
+    config = read_config()
+
+    def prepare(name, restart, verify):
+        launch = prepare_launch(name, verify, skip_backup=restart)
+        if launch is not None:
+            launch['command'].append("nogui")
+        return launch
+
+    autostart = [name for name in instance_names() if (get_instance(name) or {}).get('autostart')]
+    daemon = supervisor.Supervisor(Path(config['instances_folder']), get_supervisor_state_path(), prepare,
+                                   on_start=record_launch,
+                                   restart_delay=config['supervisor_restart_delay'],
+                                   max_restart_delay=config['supervisor_max_restart_delay'],
+                                   crash_loop_limit=config['supervisor_crash_loop_limit'],
+                                   stop_timeout=config['supervisor_stop_timeout'],
+                                   metrics=make_metrics_collector() if config['metrics_interval'] > 0 else None,
+                                   metrics_address=(config['metrics_host'], config['metrics_port']) if config['metrics_port'] else None)
+    if autostart:
+        print(f"Autostarting: {', '.join(autostart)}")
+    return daemon.run(autostart)
+
+def supervised_launch(instance_name: str, action: str = "start", verify=False, gui=False):
+    if action == "start" and is_instance_running(instance_name):
+        print(f"Error: Instance '{instance_name}' is already running.")
+        return False
+    if gui:
+        if supervisor_request("status") is None:
+            return None
+        print("Error: The supervisor runs servers without a GUI. Launch without '--gui' or stop the supervisor first.")
+        return False
+    response = supervisor_request(action, instance=instance_name, verify=verify)
+    if response is None:
+        return None
+    if not response['ok']:
+        print(f"Error: {response['error']}")
+        return False
+    print(f"Supervisor is {'restarting' if action == 'restart' else 'starting'} '{instance_name}'. Output goes to '{supervisor.log_dir(get_supervisor_state_path()) / f'{instance_name}.log'}'.")
+    return True
+
+def stop_server(instance_name: str):
+    config = read_config()
+    response = supervisor_request("stop", instance=instance_name)
+    if response is not None and response['ok']:
+        print(f"Server '{instance_name}' stopped (exit code {response['server']['last_exit']}).")
+        return True
 
-def kill_launched(pid: int):
+    info = run_state.running_info(Path(config['instances_folder']) / instance_name)
+    if info is None:
+        print(f"Instance '{instance_name}' is not running.")
+        return False
+    if not info.get('pid'):
+        print(f"Error: No PID recorded for running instance '{instance_name}'.")
+        return False
+    if not proc_identity.matches(info):
+        print(f"Error: PID {info['pid']} no longer belongs to the server of '{instance_name}'. Not stopping it.")
+        return False
     try:
-        proc = psutil.Process(pid)
+        proc = psutil.Process(info['pid'])
         proc.terminate()
-        proc.wait(timeout=10)
+        proc.wait(timeout=config['supervisor_stop_timeout'])
     except psutil.NoSuchProcess:
         pass
     except psutil.TimeoutExpired:
         proc.kill()
+    print(f"Server '{instance_name}' stopped.")
+    return True
 
-    remove_launched(pid)
+def show_status(instance_name: str = None, as_json=False):
+    config = read_config()
+    instances_path = Path(config['instances_folder'])
+    response = supervisor_request("status")
+    supervised = {server['instance']: server for server in response['servers']} if response and response['ok'] else {}
+
+    names = [instance_name] if instance_name else instance_names()
+    running = run_state.running_all([instances_path / name for name in names if name not in supervised])
+    rows = []
+    for name in names:
+        row = supervised.get(name)
+        if row is None:
+            info = running.get(instances_path / name)
+            row = {"instance": name, "state": "running" if info is not None else "stopped",
+                   "pid": (info or {}).get('pid'), "launched_at": (info or {}).get('launched_at'),
+                   "restarts": 0, "error": ""}
+        rows.append(dict(row, supervised=name in supervised))
+
+    if as_json:
+        print(json.dumps(rows, indent=4))
+        return rows
+
+    print(f"Supervisor: {'running' if response is not None else 'not running'}")
+    table = Table("--- Servers ---", [('Name', 20), ('State', 9), ('PID', 8), ('Restarts', 8), ('Launched', 19), ('Note', 30)])
+    table.print_header()
+    for row in rows:
+        launched = row['launched_at'][:19].replace("T", " ") if row.get('launched_at') and row['pid'] else ""
+        note = row['error'] or ("" if row['supervised'] or row['state'] == "stopped" else "not supervised")
+        table.print_row([row['instance'], row['state'], str(row['pid'] or ""), str(row['restarts']), launched, note])
+    table.print_closing()
+    return rows
+
+def show_stats(instance_name: str = None, as_json=False):
+    response = supervisor_request("stats", instance=instance_name)
+    if response is not None and response['ok']:
+        stats = response['stats']
+    else:
+        if response is not None:
+            print(f"Warning: {response['error']} Taking a one-off sample instead.", file=sys.stderr)
+        # CPU percent needs two samples on the same process handles.
+        collector = make_metrics_collector()
+        collector.sample()
+        time.sleep(1)
+        collector.sample()
+        stats = collector.summary(instance_name, with_history=instance_name is not None)
+
+    if as_json:
+        print(json.dumps(stats, indent=4))
+        return stats
+    if not stats:
+        print("No running instances to show stats for.")
+        return stats
+
+    def rate(value):
+        return f"{backups.format_bytes(value)}/s" if value is not None else "?"
+
+    table = Table("--- Server stats ---", [('Name', 20), ('PID', 8), ('CPU %', 6), ('RSS', 10), ('Peak RSS', 10), ('Threads', 7), ('FDs', 6), ('Read', 11), ('Write', 11)])
+    table.print_header()
+    for name, summary in stats.items():
+        latest = summary['latest']
+        cpu = f"{latest['cpu_percent']:.0f}" if latest['cpu_percent'] is not None else "?"
+        pid = str(latest['pid']) if summary['running'] else "exited"
+        table.print_row([name, pid, cpu, backups.format_bytes(latest['rss']), backups.format_bytes(summary['peak_rss']),
+                         str(latest['threads']), str(latest['open_fds']), rate(summary['read_rate']), rate(summary['write_rate'])])
+    table.print_closing()
+    return stats
 
 
 def main():
@@ -992,8 +1906,30 @@ def main():
                         help="Enable automatic world backup before launching the server.")
     parser.add_argument("-nab","--no-auto-backup", action="store_false", dest="auto_backup",
                         help="Disable automatic world backup before launching the server.")
+    parser.add_argument("-as", "--autostart", action="store_true",
+                        help="Start the instance whenever the supervisor ('supervise' command) starts.")
+    parser.add_argument("-nas", "--no-autostart", action="store_false", dest="autostart",
+                        help="Do not start the instance with the supervisor.")
+    parser.add_argument("-bm", "--backup-mode", choices=BACKUP_MODES,
+                        help="Backup mode for the instance: 'full' zips or 'incremental' deduplicated backups.")
+    parser.add_argument("-inc", "--incremental", action="store_true", default=None,
+                        help="For 'backup' command: take an incremental backup regardless of the instance backup mode.")
+    parser.add_argument("--live", action="store_true",
+                        help="For 'backup' command: back up a running server, pausing saves over RCON while the world is snapshotted.")
+    parser.add_argument("-bi", "--backup-interval", type=int,
+                        help="Minutes between scheduled backups for 'create' and 'edit' (0 disables). Run them with the 'schedule' command.")
+    parser.add_argument("-ret", "--retention",
+                        help="Retention policy for automatic backups, e.g. 'hourly=24,daily=30,weekly=8,monthly=12,max_disk_mb=0'.")
+    parser.add_argument("--path", action="append", dest="paths", default=[],
+                        help="For 'rollback': only restore world files matching this glob, e.g. 'playerdata/<uuid>.dat'. Repeatable.")
+    parser.add_argument("--dimension", action="append", dest="dimensions", default=[],
+                        help="For 'rollback': only restore this dimension (overworld, nether, end or namespace:name). Repeatable.")
+    parser.add_argument("--box", action="append", dest="boxes", default=[],
+                        help="For 'rollback': only restore chunks inside '[dimension@]x1,z1,x2,z2' (block coordinates). Repeatable.")
+    parser.add_argument("--json", action="store_true",
+                        help="For 'list', 'du', 'status' and 'stats' commands: print machine-readable JSON instead of a table.")
     parser.add_argument("-u","--upload", action="store_true", help="Upload the file to upload server.")
-    parser.set_defaults(auto_backup=None)
+    parser.set_defaults(auto_backup=None, autostart=None)
     parser.add_argument("-rp", "--resourcepack",
                         help="Path or link to the resource pack .zip file to attach (for 'attach' and 'create' commands).")
     parser.add_argument("-rpp", "--resourcepack-port", type=int,
@@ -1006,13 +1942,36 @@ def main():
                         help="Backup options for some commands.")
     parser.add_argument("-gui", "--gui",action="store_true",
                         help="Reverses default option.")
+    parser.add_argument("--verify", action="store_true",
+                        help="For 'launch' command: fully re-hash server.jar instead of trusting its stamp.")
+    parser.add_argument("-t", "--type", dest="version_type",
+                        help="Version type filter for 'versions' command (release, snapshot, old_beta, old_alpha).")
+    parser.add_argument("--before",
+                        help="For 'versions' command: show the latest version of --type released before this one.")
+    parser.add_argument("--to",
+                        help="For 'versions' command: list every version (of --type) from --version up to this one.")
     parser.add_argument("-c", "--command", required=True,
-                        choices=["create", "launch", "check", "edit", "backup", "delete", "open", "attach", "list", "edit-config", "edit-sp", "rollback", "modrinth"],
-                        help="Command to execute: 'create', 'launch', 'check', 'edit', 'backup', 'delete', 'open', 'attach', 'list', 'edit-config', 'edit-sp', 'rollback', 'modrinth'.")
+                        choices=["create", "launch", "check", "edit", "backup", "delete", "open", "attach", "list", "edit-config", "edit-sp", "rollback", "remove-backup", "modrinth", "versions", "schedule", "prune", "reconcile", "verify", "migrate", "du", "supervise", "stop", "restart", "status", "stats"],
+                        help="Command to execute: 'create', 'launch', 'check', 'edit', 'backup', 'delete', 'open', 'attach', 'list', 'edit-config', 'edit-sp', 'rollback', 'remove-backup', 'modrinth', 'versions', 'schedule', 'prune', 'reconcile', 'verify', 'migrate', 'du', 'supervise', 'stop', 'restart', 'status', 'stats'.")
 
 
     args, extra_args = parser.parse_known_args()
 
+    # Long-running commands must publish changes such as the last launch
+    # right away; everything else writes each config file once at the end.
+    if args.command in ("launch", "schedule", "supervise", "attach", "modrinth"):
+        return run_command(parser, args, extra_args)
+    with config_store.batch():
+        return run_command(parser, args, extra_args)
+
+def run_command(parser, args, extra_args):
+    retention = None
+    if args.retention is not None:
+        try:
+            retention = scheduler.parse_retention(args.retention)
+        except ValueError as e:
+            parser.error(f"Invalid --retention value: {e}")
+
     if args.command == "modrinth":
         if not args.instance:
             modrinth_cli.main(extra_args)
@@ -1022,7 +1981,7 @@ def main():
             else:
                 print("Instance does not exist.")
 
-    instance_commands = ["create", "launch", "check", "edit", "backup", "delete", "open", "attach", "edit-sp", "rollback"]
+    instance_commands = ["create", "launch", "check", "edit", "backup", "delete", "open", "attach", "edit-sp", "rollback", "remove-backup", "stop", "restart"]
     if args.command in instance_commands and not args.instance:
         parser.error(f"The '{args.command}' command requires the --instance (-i) argument.")
 
@@ -1053,7 +2012,11 @@ def main():
                             resourcepack=resourcepack_path,
                             resourcepack_port=resourcepack_port_setting,
                             loader=loader,
-                            loader_version=loader_ver)
+                            loader_version=loader_ver,
+                            backup_mode=args.backup_mode or EMPTY_INSTANCE_CFG['backup_mode'],
+                            backup_interval=args.backup_interval or 0,
+                            retention=retention,
+                            autostart=bool(args.autostart))
         except Exception as e:
             print(f"Failed to create instance '{args.instance}': {e}")
 
@@ -1061,12 +2024,14 @@ def main():
         if not check_instance(args.instance):
             print(f"Error: Instance '{args.instance}' does not exist.")
             return
-        if not any([args.version, args.memory, args.auto_backup is not None, args.resourcepack is not None, args.resourcepack_port is not None, args.loader is not None, args.loader_version is not None]):
-            print("Error: At least one of version, memory, loader, loader-version, auto-backup, resource pack file or resource pack port must be provided to edit an instance.")
+        if not any([args.version, args.memory, args.auto_backup is not None, args.resourcepack is not None, args.resourcepack_port is not None, args.loader is not None, args.loader_version is not None, args.backup_mode is not None, args.backup_interval is not None, retention is not None, args.autostart is not None]):
+            print("Error: At least one of version, memory, loader, loader-version, auto-backup, backup mode, backup interval, retention, autostart, resource pack file or resource pack port must be provided to edit an instance.")
             return
         try:
             edit_instance(args.instance, args.version, args.memory, args.auto_backup,
-                          resourcepack=args.resourcepack, resourcepack_port=args.resourcepack_port, loader=args.loader, loader_version=args.loader_version)
+                          resourcepack=args.resourcepack, resourcepack_port=args.resourcepack_port, loader=args.loader, loader_version=args.loader_version,
+                          backup_mode=args.backup_mode, backup_interval=args.backup_interval, retention=retention,
+                          autostart=args.autostart)
             print(f"Instance '{args.instance}' updated successfully.")
         except Exception as e:
             print(f"Failed to edit instance '{args.instance}': {e}")
@@ -1075,18 +2040,49 @@ def main():
         if not check_instance(args.instance):
             print(f"Error: Instance '{args.instance}' does not exist.")
             return
-        cfg = read_config()
+        # --gui flips use_gui_by_default; only asking for a GUI conflicts with the supervisor.
+        wants_gui = read_config().get("use_gui_by_default", True) ^ args.gui
+        if supervised_launch(args.instance, verify=args.verify, gui=args.gui and wants_gui) is not None:
+            return
+        launch_server(args.instance, args.gui, args.verify)
+
+    elif args.command == "supervise":
+        run_supervisor()
+
+    elif args.command == "stop":
+        if not check_instance(args.instance):
+            print(f"Error: Instance '{args.instance}' does not exist.")
+            return
+        stop_server(args.instance)
 
-        launch_server(args.instance, args.gui)
+    elif args.command == "restart":
+        if not check_instance(args.instance):
+            print(f"Error: Instance '{args.instance}' does not exist.")
+            return
+        if supervised_launch(args.instance, "restart") is None:
+            print("Error: 'restart' needs a running supervisor. Start one with the 'supervise' command.")
+
+    elif args.command == "status":
+        if args.instance and not check_instance(args.instance):
+            print(f"Error: Instance '{args.instance}' does not exist.")
+            return
+        show_status(args.instance, args.json)
+
+    elif args.command == "stats":
+        if args.instance and not check_instance(args.instance):
+            print(f"Error: Instance '{args.instance}' does not exist.")
+            return
+        show_stats(args.instance, args.json)
 
     elif args.command == "backup":
         if not check_instance(args.instance):
             print(f"Error: Instance '{args.instance}' does not exist.")
             return
+        backup_func = live_backup_instance if args.live else backup_instance
         if args.backup:
-            backup_instance(args.instance, desc=args.backup)
+            backup_func(args.instance, desc=args.backup, incremental=args.incremental)
             return
-        backup_instance(args.instance)
+        backup_func(args.instance, incremental=args.incremental)
 
     elif args.command == "rollback":
         if not check_instance(args.instance):
@@ -1095,8 +2091,58 @@ def main():
         if not args.backup:
             print(f"Specify backup if with '--backup' option.'")
             return
+        if args.paths or args.dimensions or args.boxes:
+            partial_rollback_instance(args.instance, args.backup, args.paths, args.dimensions, args.boxes)
+            return
         rollback_instance(args.instance, args.backup)
 
+    elif args.command == "remove-backup":
+        if not check_instance(args.instance):
+            print(f"Error: Instance '{args.instance}' does not exist.")
+            return
+        if not args.backup:
+            print("Specify backup id with '--backup' option.")
+            return
+        remove_backup(args.instance, args.backup)
+
+    elif args.command == "prune":
+        if args.instance:
+            if not check_instance(args.instance):
+                print(f"Error: Instance '{args.instance}' does not exist.")
+                return
+            prune_backups(args.instance)
+            return
+        for name in instance_names():
+            prune_backups(name)
+
+    elif args.command == "du":
+        if args.instance and not check_instance(args.instance):
+            print(f"Error: Instance '{args.instance}' does not exist.")
+            return
+        show_disk_usage(args.instance, args.json)
+
+    elif args.command == "migrate":
+        migrate_configs()
+
+    elif args.command == "verify":
+        if args.instance and not check_instance(args.instance):
+            print(f"Error: Instance '{args.instance}' does not exist.")
+            return
+        if args.backup and not args.instance:
+            parser.error("Verifying a single backup requires the --instance (-i) argument.")
+        for name in ([args.instance] if args.instance else instance_names()):
+            verify_backups(name, args.backup)
+
+    elif args.command == "reconcile":
+        for name in ([args.instance] if args.instance else instance_names()):
+            if not check_instance(name):
+                print(f"Error: Instance '{name}' does not exist.")
+                return
+            reconcile_backups(name)
+
+    elif args.command == "schedule":
+        run_backup_scheduler()
+
     elif args.command == "delete":
         if not check_instance(args.instance):
             print(f"Error: Instance '{args.instance}' does not exist.")
@@ -1136,9 +2182,12 @@ def main():
             if not check_instance(args.instance):
                 print(f"Error: Instance '{args.instance}' does not exist.")
                 return
-            list_backups(args.instance)
+            list_backups(args.instance, args.json)
             return
-        list_instances()
+        list_instances(args.json)
+
+    elif args.command == "versions":
+        list_versions(args.version, args.version_type, args.before, args.to)
 
     elif args.command == "edit-config":
         if not any([args.key is not None, args.value is not None]):
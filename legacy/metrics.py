@@ -0,0 +1,172 @@
+import collections
+import http.server
+import threading
+import time
+
+import psutil
+
+import proc_identity
+
+DEFAULT_INTERVAL = 15
+DEFAULT_HISTORY = 240
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (sample key, metric name, type, help)
+PROMETHEUS_METRICS = (
+    ("cpu_seconds", "mserver_cpu_seconds_total", "counter", "User and system CPU time of the server process."),
+    ("cpu_percent", "mserver_cpu_percent", "gauge", "CPU usage since the previous sample, 100 per core."),
+    ("rss", "mserver_resident_memory_bytes", "gauge", "Resident set size of the server process."),
+    ("vms", "mserver_virtual_memory_bytes", "gauge", "Virtual memory size of the server process."),
+    ("threads", "mserver_threads", "gauge", "Number of threads in the server process."),
+    ("open_fds", "mserver_open_fds", "gauge", "Open file descriptors (handles on Windows)."),
+    ("read_bytes", "mserver_read_bytes_total", "counter", "Bytes read from storage by the server process."),
+    ("write_bytes", "mserver_write_bytes_total", "counter", "Bytes written to storage by the server process."),
+)
+
+
+def _escape_label(value: str):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _rate(previous: dict, latest: dict, key: str):
+    if previous is None or latest.get(key) is None or previous.get(key) is None:
+        return None
+    elapsed = latest["time"] - previous["time"]
+    if elapsed <= 0 or latest["pid"] != previous["pid"]:
+        return None
+    return (latest[key] - previous[key]) / elapsed
+
+
+class MetricsCollector:
+    def __init__(self, targets, interval: float = DEFAULT_INTERVAL, history: int = DEFAULT_HISTORY):
+        # targets() returns {instance name: run record with pid and create_time}.
+        self.targets = targets
+        self.interval = interval
+        self.history = history
+        self.samples = {}
+        self.processes = {}
+        self.lock = threading.Lock()
+
+    def _process(self, name: str, record: dict):
+        # Handles are kept between samples: psutil only reports CPU percent
+        # relative to the previous call on the same Process object.
+        key = (record["pid"], record.get("create_time"))
+        cached = self.processes.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1], False
+        process = psutil.Process(record["pid"])
+        if not proc_identity.matches(record):
+            raise psutil.NoSuchProcess(record["pid"])
+        self.processes[name] = (key, process)
+        return process, True
+
+    def _read(self, process, fresh: bool):
+        with process.oneshot():
+            cpu_times = process.cpu_times()
+            memory = process.memory_info()
+            cpu_percent = process.cpu_percent()
+            sample = {
+                "cpu_seconds": cpu_times.user + cpu_times.system,
+                "cpu_percent": None if fresh else cpu_percent,
+                "rss": memory.rss,
+                "vms": memory.vms,
+                "threads": process.num_threads(),
+                "open_fds": process.num_fds() if hasattr(process, "num_fds") else process.num_handles(),
+                "read_bytes": None,
+                "write_bytes": None,
+            }
+            try:
+                io = process.io_counters()
+                sample["read_bytes"] = io.read_bytes
+                sample["write_bytes"] = io.write_bytes
+            except (AttributeError, psutil.AccessDenied):
+                pass
+        return sample
+
+    def sample(self):
+        now = time.time()
+        targets = self.targets()
+        with self.lock:
+            for name in list(self.processes):
+                if name not in targets:
+                    del self.processes[name]
+            for name, record in targets.items():
+                if not record.get("pid"):
+                    continue
+                try:
+                    sample = self._read(*self._process(name, record))
+                except psutil.NoSuchProcess:
+                    self.processes.pop(name, None)
+                    continue
+                except psutil.AccessDenied:
+                    continue
+                sample["time"] = now
+                sample["pid"] = record["pid"]
+                self.samples.setdefault(name, collections.deque(maxlen=self.history)).append(sample)
+
+    def summary(self, name: str = None, with_history: bool = False):
+        with self.lock:
+            names = [name] if name is not None else sorted(self.samples)
+            result = {}
+            for instance in names:
+                history = list(self.samples.get(instance, ()))
+                if not history:
+                    continue
+                latest = history[-1]
+                previous = history[-2] if len(history) > 1 else None
+                result[instance] = {
+                    "running": instance in self.processes,
+                    "latest": latest,
+                    "read_rate": _rate(previous, latest, "read_bytes"),
+                    "write_rate": _rate(previous, latest, "write_bytes"),
+                    "peak_rss": max(sample["rss"] for sample in history),
+                    "samples": len(history),
+                    "window": latest["time"] - history[0]["time"],
+                }
+                if with_history:
+                    result[instance]["history"] = history
+            return result
+
+    def prometheus_text(self):
+        with self.lock:
+            running = set(self.processes)
+            latest = {name: history[-1] for name, history in sorted(self.samples.items())
+                      if history and name in running}
+            seen = sorted(self.samples)
+        lines = [
+            "# HELP mserver_up Whether the instance's server process was running at the last sample.",
+            "# TYPE mserver_up gauge",
+        ]
+        lines += [f"mserver_up{{instance=\"{_escape_label(name)}\"}} {int(name in running)}" for name in seen]
+        for key, metric, metric_type, help_text in PROMETHEUS_METRICS:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            for name, sample in latest.items():
+                if sample.get(key) is not None:
+                    lines.append(f"{metric}{{instance=\"{_escape_label(name)}\"}} {sample[key]}")
+        return "\n".join(lines) + "\n"
+
+
+class PrometheusHandler(http.server.BaseHTTPRequestHandler):
+    collector = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.collector.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_prometheus(collector: MetricsCollector, host: str, port: int):
+    handler = type("BoundPrometheusHandler", (PrometheusHandler,), {"collector": collector})
+    httpd = http.server.ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
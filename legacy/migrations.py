@@ -0,0 +1,65 @@
+import copy
+
+# Bump these together with a new migration step whenever keys are added to
+# or reshaped in the default configs. Configs already at the current
+# version are used as they are.
+CONFIG_VERSION = 5
+INSTANCE_CFG_VERSION = 5
+
+
+def _fill_defaults(data: dict, defaults: dict):
+    for key, value in defaults.items():
+        if key not in data:
+            data[key] = copy.deepcopy(value)
+
+
+def _instance_version_to_dict(cfg: dict, defaults: dict):
+    if isinstance(cfg.get("version"), str):
+        cfg["version"] = {
+            "minecraft": cfg["version"],
+            "loader": {
+                "type": "vanilla",
+                "version": ""
+            }
+        }
+
+
+def _drop_launched_list(cfg: dict, defaults: dict):
+    # Running servers are tracked by their instance run lock now.
+    cfg.pop("launched", None)
+    _fill_defaults(cfg, defaults)
+
+
+CONFIG_MIGRATIONS = {
+    0: _fill_defaults,
+    1: _fill_defaults,
+    2: _fill_defaults,
+    3: _drop_launched_list,
+    4: _fill_defaults,
+}
+INSTANCE_MIGRATIONS = {
+    1: _instance_version_to_dict,
+    2: _fill_defaults,
+    3: _fill_defaults,
+    4: _fill_defaults,
+}
+
+
+def _migrate(data: dict, version_key: str, first_version: int, target: int, migrations: dict, defaults: dict):
+    version = data.get(version_key, first_version)
+    if version >= target:
+        return False
+    while version < target:
+        migrations[version](data, defaults)
+        version += 1
+    data[version_key] = target
+    return True
+
+
+def migrate_config(cfg: dict, defaults: dict):
+    return _migrate(cfg, "config_version", 0, CONFIG_VERSION, CONFIG_MIGRATIONS, defaults)
+
+
+def migrate_instance_cfg(cfg: dict, defaults: dict):
+    # The first instance configs had no cfg_version key at all.
+    return _migrate(cfg, "cfg_version", 1, INSTANCE_CFG_VERSION, INSTANCE_MIGRATIONS, defaults)
@@ -0,0 +1,125 @@
+import hashlib
+import os
+import time
+
+import psutil
+
+PROC = "/proc"
+# psutil derives create_time from the same clock ticks, but both sides go
+# through float division, so compare with a little slack.
+CREATE_TIME_TOLERANCE = 0.05
+# A child that has not finished exec() yet has an empty command line.
+CMDLINE_ATTEMPTS = 20
+CMDLINE_RETRY_DELAY = 0.025
+
+EMPTY_CMDLINE_SHA1 = hashlib.sha1(b"").hexdigest()
+
+_boot_time = None
+
+
+def _linux():
+    return os.path.isfile(f"{PROC}/self/stat")
+
+
+def _linux_boot_time():
+    global _boot_time
+    if _boot_time is None:
+        with open(f"{PROC}/stat", "rb") as f:
+            for line in f:
+                if line.startswith(b"btime "):
+                    _boot_time = int(line.split()[1])
+                    break
+    return _boot_time
+
+
+def _linux_create_time(pid: int):
+    try:
+        with open(f"{PROC}/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except (FileNotFoundError, ProcessLookupError):
+        return None
+    # The command name in parentheses may itself contain spaces or ")".
+    fields = stat[stat.rindex(b")") + 2:].split()
+    if fields[0] == b"Z":
+        return None
+    return _linux_boot_time() + int(fields[19]) / os.sysconf("SC_CLK_TCK")
+
+
+def _linux_cmdline(pid: int):
+    try:
+        with open(f"{PROC}/{pid}/cmdline", "rb") as f:
+            raw = f.read().rstrip(b"\0")
+    except (FileNotFoundError, ProcessLookupError):
+        return None
+    return raw.split(b"\0") if raw else None
+
+
+def create_time(pid: int):
+    if _linux():
+        return _linux_create_time(pid)
+    try:
+        process = psutil.Process(pid)
+        if process.status() == psutil.STATUS_ZOMBIE:
+            return None
+        return process.create_time()
+    except psutil.NoSuchProcess:
+        return None
+
+
+def cmdline_sha1(pid: int):
+    if _linux():
+        cmdline = _linux_cmdline(pid)
+    else:
+        try:
+            cmdline = [part.encode("utf-8") for part in psutil.Process(pid).cmdline()]
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            cmdline = None
+    if not cmdline:
+        return None
+    return hashlib.sha1(b"\0".join(cmdline)).hexdigest()
+
+
+def identify(pid: int):
+    started = create_time(pid)
+    if started is None:
+        return None
+    cmdline = cmdline_sha1(pid)
+    for _ in range(CMDLINE_ATTEMPTS):
+        if cmdline is not None:
+            break
+        time.sleep(CMDLINE_RETRY_DELAY)
+        cmdline = cmdline_sha1(pid)
+    return {"pid": pid, "create_time": started, "cmdline_sha1": cmdline}
+
+
+def _same_start(recorded, current):
+    return current is not None and recorded is not None and abs(current - recorded) < CREATE_TIME_TOLERANCE
+
+
+def matches(record: dict):
+    # PIDs get reused, so only treat a record as our process when its start
+    # time and command line are still the same. Checked before signalling.
+    pid = record.get("pid")
+    if not pid or not _same_start(record.get("create_time"), create_time(pid)):
+        return False
+    # An unknown command line on either side only leaves the start time to go by.
+    recorded_cmdline = record.get("cmdline_sha1")
+    if not recorded_cmdline or recorded_cmdline == EMPTY_CMDLINE_SHA1:
+        return True
+    current_cmdline = cmdline_sha1(pid)
+    return current_cmdline is None or current_cmdline == recorded_cmdline
+
+
+def alive(records):
+    # Returns the PIDs of the records whose process still runs. One listing
+    # of the process table up front, then a start time read only for the
+    # recorded PIDs that are in it.
+    records = [record for record in records if record.get("pid") and record.get("create_time") is not None]
+    if not records:
+        return set()
+    if _linux():
+        running = {int(name) for name in os.listdir(PROC) if name.isdigit()}
+    else:
+        running = set(psutil.pids())
+    return {record["pid"] for record in records
+            if record["pid"] in running and _same_start(record["create_time"], create_time(record["pid"]))}
@@ -0,0 +1,77 @@
+import itertools
+import socket
+import struct
+
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_RESPONSE_VALUE = 0
+MAX_PACKET_SIZE = 4110
+
+
+class RconError(Exception):
+    pass
+
+
+class RconClient:
+    def __init__(self, host: str, port: int, password: str, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self._sock = None
+        self._ids = itertools.count(1)
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        request_id = self._send(SERVERDATA_AUTH, self.password)
+        response_id, packet_type, _ = self._receive()
+        if packet_type != SERVERDATA_AUTH_RESPONSE:
+            response_id, packet_type, _ = self._receive()
+        if response_id == -1 or response_id != request_id:
+            self.close()
+            raise RconError("RCON authentication failed. Check rcon.password in server.properties.")
+
+    def command(self, command: str) -> str:
+        if self._sock is None:
+            raise RconError("RCON client is not connected.")
+        request_id = self._send(SERVERDATA_EXECCOMMAND, command)
+        response_id, _, body = self._receive()
+        if response_id != request_id:
+            raise RconError(f"Unexpected RCON response id {response_id} for '{command}'.")
+        return body
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _send(self, packet_type: int, body: str) -> int:
+        request_id = next(self._ids)
+        payload = struct.pack("<ii", request_id, packet_type) + body.encode("utf-8") + b"\x00\x00"
+        self._sock.sendall(struct.pack("<i", len(payload)) + payload)
+        return request_id
+
+    def _read_exactly(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self._sock.recv(size - len(data))
+            if not chunk:
+                raise RconError("RCON connection closed by the server.")
+            data += chunk
+        return bytes(data)
+
+    def _receive(self):
+        length = struct.unpack("<i", self._read_exactly(4))[0]
+        if length < 10 or length > MAX_PACKET_SIZE:
+            raise RconError(f"Invalid RCON packet length {length}.")
+        packet = self._read_exactly(length)
+        response_id, packet_type = struct.unpack_from("<ii", packet)
+        return response_id, packet_type, packet[8:-2].decode("utf-8", errors="replace")
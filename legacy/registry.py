@@ -0,0 +1,115 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import config_store
+
+REGISTRY_VERSION = 2
+DEFAULT_WORKERS = 16
+SIZE_KEYS = ("size", "world_size", "backups_size", "size_measured_at")
+
+
+def _cfg_key(cfg_path: str):
+    try:
+        st = os.stat(cfg_path)
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+
+class InstanceRegistry:
+    def __init__(self, instances_path: Path, cache_path: Path, load_instance, measure=None,
+                 size_ttl: float = 3600, workers: int = DEFAULT_WORKERS):
+        self.instances_path = Path(instances_path)
+        self.cache_path = Path(cache_path)
+        self.load_instance = load_instance
+        self.measure = measure
+        self.size_ttl = size_ttl
+        self.workers = workers
+
+    def _candidates(self):
+        try:
+            with os.scandir(self.instances_path) as it:
+                return sorted(entry.name for entry in it if not entry.name.startswith(".") and entry.is_dir())
+        except FileNotFoundError:
+            return []
+
+    def _stat_all(self, names):
+        # Stat calls on network filesystems are slow when cold but overlap
+        # well, so they go through a pool instead of one by one.
+        paths = [os.path.join(self.instances_path, name, "cfg.json") for name in names]
+        if len(paths) <= 1:
+            return dict(zip(names, map(_cfg_key, paths)))
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(paths))) as pool:
+            return dict(zip(names, pool.map(_cfg_key, paths)))
+
+    def names(self):
+        return [name for name, key in self._stat_all(self._candidates()).items() if key is not None]
+
+    def _describe(self, name: str, key, old: dict):
+        cfg = self.load_instance(name)
+        if cfg is None:
+            return None
+        version = cfg.get("version", {})
+        entry = {
+            "name": name,
+            "loader": version.get("loader", {}).get("type", ""),
+            "loader_version": version.get("loader", {}).get("version", ""),
+            "version": version.get("minecraft", ""),
+            "memory": cfg.get("memory", ""),
+            "auto_backup": cfg.get("auto_backup", False),
+            "backup_mode": cfg.get("backup_mode", ""),
+            "last_launch": cfg.get("last_launch", ""),
+            "key": key,
+        }
+        for size_key in SIZE_KEYS:
+            entry[size_key] = old.get(size_key) if old else None
+        return entry
+
+    def _needs_size(self, entry: dict, now: float):
+        if self.measure is None:
+            return False
+        measured_at = entry.get("size_measured_at")
+        return measured_at is None or now - measured_at > self.size_ttl
+
+    def _measure(self, entry: dict, now: float):
+        entry.update(self.measure(self.instances_path / entry["name"]))
+        entry["size_measured_at"] = now
+
+    def scan(self, with_sizes: bool = True):
+        cache = config_store.read_json(self.cache_path, default={})
+        cached = cache.get("instances", {}) if cache.get("version") == REGISTRY_VERSION else {}
+
+        keys = self._stat_all(self._candidates())
+        now = time.time()
+        entries = {}
+        stale = []
+        for name, key in keys.items():
+            if key is None:
+                continue
+            old = cached.get(name)
+            if old is not None and old.get("key") == key:
+                entries[name] = old
+            else:
+                stale.append((name, key, old))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [(name, pool.submit(self._describe, name, key, old)) for name, key, old in stale]
+            errors = {}
+            for name, future in futures:
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    errors[name] = e
+                    continue
+                if entry is not None:
+                    entries[name] = entry
+            if with_sizes:
+                measured = [pool.submit(self._measure, entry, now) for entry in entries.values() if self._needs_size(entry, now)]
+                for future in measured:
+                    future.result()
+
+        if entries != cached:
+            config_store.write_json(self.cache_path, {"version": REGISTRY_VERSION, "instances": entries})
+        return [entries[name] for name in sorted(entries)], errors
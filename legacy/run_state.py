@@ -0,0 +1,97 @@
+import json
+import os
+from pathlib import Path
+
+import proc_identity
+from locking import acquire_lock, release_lock, LockBusy
+
+RUN_LOCK_NAME = ".server.lock"
+
+
+def run_lock_path(instance_path: Path) -> Path:
+    return Path(instance_path) / RUN_LOCK_NAME
+
+
+def write_info(lock, info: dict):
+    lock.seek(0)
+    lock.truncate()
+    lock.write(json.dumps(info))
+    lock.flush()
+
+
+def record_process(lock, info: dict, pid: int):
+    # Saved next to the PID so a reused PID is never mistaken for the server.
+    identity = proc_identity.identify(pid) or {"pid": pid}
+    write_info(lock, dict(info, **identity, lock_inherited=bool(inheritable(lock))))
+
+
+def claim(instance_path: Path, info: dict):
+    # Whoever runs a server holds this lock for as long as it lives, so
+    # "running" is simply "locked" and can never go stale after a crash.
+    lock = acquire_lock(run_lock_path(instance_path), blocking=False)
+    write_info(lock, info)
+    return lock
+
+
+def inheritable(lock):
+    return (lock.fileno(),) if os.name == "posix" else ()
+
+
+def hand_over(lock):
+    # The server process inherited the locked file (see inheritable()), so
+    # closing our copy without unlocking leaves the lock with the server.
+    # Unlocking here would release it for the child as well.
+    if os.name != "posix":
+        return lock
+    lock.close()
+    return None
+
+
+def release(lock):
+    if lock is not None:
+        release_lock(lock)
+
+
+def read_info(instance_path: Path):
+    try:
+        return json.loads(run_lock_path(instance_path).read_text() or "{}")
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        return {}
+
+
+def _probe(instance_path: Path):
+    # Returns (locked, info). Servers started where the lock could not be
+    # inherited leave an unlocked record that is checked by identity instead.
+    path = run_lock_path(instance_path)
+    if not path.exists():
+        return False, None
+    try:
+        lock = acquire_lock(path, blocking=False)
+    except LockBusy:
+        return True, read_info(instance_path) or {}
+    release_lock(lock)
+    info = read_info(instance_path)
+    if info and info.get("lock_inherited") is False:
+        return False, info
+    return False, None
+
+
+def running_info(instance_path: Path):
+    return running_all([instance_path]).get(instance_path)
+
+
+def running_all(instance_paths):
+    running = {}
+    unlocked = {}
+    for instance_path in instance_paths:
+        locked, info = _probe(instance_path)
+        if locked:
+            running[instance_path] = info
+        elif info is not None:
+            unlocked[instance_path] = info
+    if unlocked:
+        live = proc_identity.alive(unlocked.values())
+        running.update((path, info) for path, info in unlocked.items() if info.get("pid") in live)
+    return running
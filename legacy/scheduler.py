@@ -0,0 +1,132 @@
+import time
+from datetime import datetime, timedelta
+
+DATETIME_FORMAT = "%Y.%m.%d-%H:%M:%S"
+DEFAULT_RETENTION = {
+    "hourly": 24,
+    "daily": 30,
+    "weekly": 8,
+    "monthly": 12,
+    "max_disk_mb": 0,
+}
+RETENTION_WINDOWS = (
+    ("hourly", lambda dt: (dt.year, dt.month, dt.day, dt.hour), lambda n: timedelta(hours=n)),
+    ("daily", lambda dt: (dt.year, dt.month, dt.day), lambda n: timedelta(days=n)),
+    ("weekly", lambda dt: tuple(dt.isocalendar()[:2]), lambda n: timedelta(weeks=n)),
+    ("monthly", lambda dt: (dt.year, dt.month), lambda n: timedelta(days=31 * n)),
+)
+
+
+def parse_backup_datetime(value: str):
+    try:
+        return datetime.strptime(value, DATETIME_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_retention(value: str):
+    policy = dict(DEFAULT_RETENTION)
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        key, _, number = part.partition("=")
+        key = key.strip()
+        if key not in DEFAULT_RETENTION:
+            raise ValueError(f"Unknown retention key '{key}'. Valid keys: {', '.join(DEFAULT_RETENTION)}.")
+        policy[key] = int(number)
+    return policy
+
+
+def select_retained(backups: dict, policy: dict, now: datetime = None):
+    now = now or datetime.now()
+    dated = []
+    for backup_id, info in backups.items():
+        dt = parse_backup_datetime(info.get("datetime"))
+        if dt is not None:
+            dated.append((dt, backup_id))
+    dated.sort(reverse=True)
+
+    keep = {backup_id for backup_id, info in backups.items() if parse_backup_datetime(info.get("datetime")) is None}
+    if dated:
+        keep.add(dated[0][1])
+
+    for name, bucket_of, window in RETENTION_WINDOWS:
+        count = policy.get(name, 0)
+        if count <= 0:
+            continue
+        oldest = now - window(count)
+        seen = set()
+        for dt, backup_id in dated:
+            if dt < oldest:
+                break
+            bucket = bucket_of(dt)
+            if bucket not in seen:
+                seen.add(bucket)
+                keep.add(backup_id)
+    return keep
+
+
+class BackupScheduler:
+    def __init__(self, list_instances, get_schedule, get_backups, is_running, run_backup, prune,
+                 poll_interval: float = 60, verify=None, verify_interval: float = 0):
+        self.list_instances = list_instances
+        self.get_schedule = get_schedule
+        self.get_backups = get_backups
+        self.is_running = is_running
+        self.run_backup = run_backup
+        self.prune = prune
+        self.poll_interval = poll_interval
+        self.verify = verify
+        self.verify_interval = verify_interval
+        self.last_attempt = {}
+        self.last_verify = {}
+
+    def due(self, instance_name: str, schedule: dict, now: datetime):
+        interval = schedule.get("interval_minutes", 0)
+        if interval <= 0:
+            return False
+        if schedule.get("only_while_running", True) and not self.is_running(instance_name):
+            return False
+
+        last = self.last_attempt.get(instance_name)
+        for info in self.get_backups(instance_name).values():
+            dt = parse_backup_datetime(info.get("datetime"))
+            if dt is not None and (last is None or dt > last):
+                last = dt
+        return last is None or now - last >= timedelta(minutes=interval)
+
+    def tick(self, now: datetime = None):
+        now = now or datetime.now()
+        for instance_name in self.list_instances():
+            schedule = self.get_schedule(instance_name)
+            if not schedule:
+                continue
+            try:
+                if self.due(instance_name, schedule, now):
+                    self.last_attempt[instance_name] = now
+                    print(f"[{now.strftime(DATETIME_FORMAT)}] Scheduled backup of '{instance_name}'...")
+                    # Only prune once a new backup exists.
+                    if self.run_backup(instance_name, schedule) is False:
+                        print(f"Scheduled backup of '{instance_name}' failed. Skipping retention.")
+                        continue
+                    self.prune(instance_name)
+            except Exception as e:
+                print(f"Scheduled backup of '{instance_name}' failed: {e}")
+
+        if self.verify is None:
+            return
+        for instance_name in self.list_instances():
+            last = self.last_verify.get(instance_name)
+            if last is not None and (now - last).total_seconds() < self.verify_interval:
+                continue
+            self.last_verify[instance_name] = now
+            try:
+                self.verify(instance_name)
+            except Exception as e:
+                print(f"Background verification of '{instance_name}' failed: {e}")
+
+    def run_forever(self):
+        print(f"Backup scheduler started. Checking instances every {self.poll_interval:.0f}s. Press Ctrl+C to stop.")
+        while True:
+            self.tick()
+            time.sleep(self.poll_interval)
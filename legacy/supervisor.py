@@ -0,0 +1,436 @@
+import asyncio
+import functools
+import http.server
+import json
+import os
+import secrets
+import signal
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import config_store
+import metrics
+import run_state
+from locking import file_lock, LockBusy
+
+READ_LIMIT = 1 << 20
+CONNECT_TIMEOUT = 5
+KILL_TIMEOUT = 10
+
+
+def log_dir(state_path: Path) -> Path:
+    return Path(state_path).parent / "supervisor-logs"
+
+
+class ResourcePackHTTPHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class ManagedServer:
+    def __init__(self, name: str, instance_path: Path):
+        self.name = name
+        self.instance_path = instance_path
+        self.state = "stopped"
+        self.want_running = False
+        self.process = None
+        self.lock = None
+        self.started_at = None
+        self.started_mono = None
+        self.restarts = 0
+        self.failures = 0
+        self.last_exit = None
+        self.next_start = None
+        self.error = ""
+        self.task = None
+        self.wake = asyncio.Event()
+        # Applies to the next spawn only, not to crash restarts after it.
+        self.verify = False
+
+    def active(self):
+        return self.task is not None and not self.task.done()
+
+    def status(self):
+        return {
+            "instance": self.name,
+            "state": self.state,
+            "pid": self.process.pid if self.process is not None and self.process.returncode is None else None,
+            "launched_at": self.started_at,
+            "restarts": self.restarts,
+            "failures": self.failures,
+            "last_exit": self.last_exit,
+            "next_start": self.next_start,
+            "error": self.error,
+        }
+
+
+class Supervisor:
+    def __init__(self, instances_path: Path, state_path: Path, prepare, on_start=None,
+                 restart_delay: float = 5, max_restart_delay: float = 300, stable_after: float = 300,
+                 crash_loop_limit: int = 5, stop_timeout: float = 60, metrics=None, metrics_address=None):
+        self.instances_path = Path(instances_path)
+        self.state_path = Path(state_path)
+        self.log_dir = log_dir(self.state_path)
+        self.prepare = prepare
+        self.on_start = on_start
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stable_after = stable_after
+        self.crash_loop_limit = crash_loop_limit
+        self.stop_timeout = stop_timeout
+        self.metrics = metrics
+        self.metrics_address = metrics_address
+        self.token = secrets.token_hex(16)
+        self.servers = {}
+        self.rp_hosts = {}
+        self.shutdown_event = None
+
+    def _valid_instance(self, name):
+        return (isinstance(name, str) and name and name == Path(name).name and not name.startswith(".")
+                and (self.instances_path / name / "cfg.json").is_file())
+
+    def _server(self, name: str):
+        server = self.servers.get(name)
+        if server is None:
+            server = self.servers[name] = ManagedServer(name, self.instances_path / name)
+        return server
+
+    def _open_log(self, name: str):
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        log_path = self.log_dir / f"{name}.log"
+        if log_path.exists():
+            os.replace(log_path, log_path.with_suffix(".log.1"))
+        return open(log_path, "wb")
+
+    def _host_resourcepack(self, name: str, directory: str, port: int):
+        host = self.rp_hosts.get(port)
+        if host is None:
+            handler = functools.partial(ResourcePackHTTPHandler, directory=directory)
+            httpd = http.server.ThreadingHTTPServer(("0.0.0.0", port), handler)
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+            host = self.rp_hosts[port] = {"httpd": httpd, "directory": directory, "users": set()}
+            print(f"Serving resource packs from '{directory}' on port {port}.")
+        elif host["directory"] != directory:
+            raise OSError(f"Port {port} already serves resource packs from '{host['directory']}'.")
+        host["users"].add(name)
+
+    async def _release_resourcepack(self, name: str):
+        for port, host in list(self.rp_hosts.items()):
+            host["users"].discard(name)
+            if not host["users"]:
+                del self.rp_hosts[port]
+                await asyncio.to_thread(host["httpd"].shutdown)
+                host["httpd"].server_close()
+
+    async def _spawn(self, server: ManagedServer, restart: bool):
+        try:
+            verify, server.verify = server.verify, False
+            launch = await asyncio.to_thread(self.prepare, server.name, restart, verify)
+        except Exception as e:
+            print(f"Error preparing '{server.name}': {e}")
+            launch = None
+        if launch is None:
+            server.error = "Launch preparation failed."
+            return False
+        if not server.want_running:
+            return False
+
+        started_at = datetime.now(timezone.utc).isoformat()
+        info = {"instance": server.name, "supervisor": os.getpid(), "launched_at": started_at}
+        try:
+            lock = run_state.claim(server.instance_path, info)
+        except LockBusy:
+            running = run_state.running_info(server.instance_path) or {}
+            server.error = f"Already running outside the supervisor (pid {running.get('pid', '?')})."
+            server.want_running = False
+            return False
+
+        try:
+            if launch.get("resourcepack"):
+                self._host_resourcepack(server.name, *launch["resourcepack"])
+            with self._open_log(server.name) as log:
+                server.process = await asyncio.create_subprocess_exec(
+                    *launch["command"], cwd=launch["cwd"],
+                    stdin=asyncio.subprocess.PIPE, stdout=log, stderr=asyncio.subprocess.STDOUT,
+                    start_new_session=True, pass_fds=run_state.inheritable(lock))
+        except OSError as e:
+            run_state.release(lock)
+            await self._release_resourcepack(server.name)
+            server.error = str(e)
+            print(f"Error starting '{server.name}': {e}")
+            return False
+
+        # Waits briefly for the child's exec(), so keep it off the event loop.
+        await asyncio.to_thread(run_state.record_process, lock, info, server.process.pid)
+        server.lock = run_state.hand_over(lock)
+        server.state = "running"
+        server.error = ""
+        server.started_at = started_at
+        server.started_mono = time.monotonic()
+        print(f"Started '{server.name}' with PID {server.process.pid}.")
+        if self.on_start is not None:
+            try:
+                await asyncio.to_thread(self.on_start, server.name, started_at)
+            except Exception as e:
+                print(f"Warning: Could not record the launch of '{server.name}': {e}")
+        return True
+
+    async def _exited(self, server: ManagedServer, code: int):
+        run_state.release(server.lock)
+        server.lock = None
+        server.last_exit = code
+        await self._release_resourcepack(server.name)
+        print(f"Server '{server.name}' exited with code {code}.")
+
+    async def _run(self, server: ManagedServer):
+        restart = False
+        while server.want_running:
+            server.state = "starting"
+            if await self._spawn(server, restart):
+                if not server.want_running:
+                    # Stopped while the process was being spawned.
+                    await self._stop_process(server, self.stop_timeout)
+                # Woken by the event loop's child watcher (a pidfd on Linux),
+                # so exits are noticed without polling.
+                code = await server.process.wait()
+                await self._exited(server, code)
+                if not server.want_running:
+                    break
+                if code == 0:
+                    # A clean exit means someone ran /stop in-game.
+                    server.want_running = False
+                    break
+                if time.monotonic() - server.started_mono >= self.stable_after:
+                    server.failures = 0
+            if not server.want_running:
+                break
+            restart = True
+
+            server.failures += 1
+            if server.failures > self.crash_loop_limit:
+                server.state = "failed"
+                server.want_running = False
+                server.error = f"Crashed {server.failures} times in a row. Not restarting."
+                print(f"Server '{server.name}' is crash-looping. Giving up until it is started again.")
+                return
+            delay = min(self.restart_delay * 2 ** (server.failures - 1), self.max_restart_delay)
+            server.state = "backoff"
+            server.next_start = time.time() + delay
+            print(f"Restarting '{server.name}' in {delay:.0f}s (attempt {server.failures}).")
+            server.wake.clear()
+            try:
+                await asyncio.wait_for(server.wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            server.next_start = None
+            if server.want_running:
+                server.restarts += 1
+        server.state = "stopped"
+
+    def start(self, name: str, verify: bool = False):
+        server = self._server(name)
+        server.want_running = True
+        server.verify = server.verify or verify
+        if server.active():
+            # Skip the rest of a backoff wait.
+            server.wake.set()
+            return server
+        server.state = "starting"
+        server.failures = 0
+        server.error = ""
+        server.task = asyncio.create_task(self._run(server))
+        return server
+
+    async def _stop_process(self, server: ManagedServer, timeout: float):
+        process = server.process
+        try:
+            process.stdin.write(b"stop\n")
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+            return
+        except asyncio.TimeoutError:
+            print(f"Server '{server.name}' did not stop within {timeout:.0f}s. Terminating it.")
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), KILL_TIMEOUT)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+    async def stop(self, name: str):
+        server = self.servers.get(name)
+        if server is None or not server.active():
+            return False
+        server.want_running = False
+        server.wake.set()
+        if server.process is not None and server.process.returncode is None:
+            server.state = "stopping"
+            await self._stop_process(server, self.stop_timeout)
+        await server.task
+        return True
+
+    async def restart(self, name: str):
+        await self.stop(name)
+        return self.start(name)
+
+    def status(self):
+        return [self.servers[name].status() for name in sorted(self.servers)]
+
+    async def _dispatch(self, request):
+        if not isinstance(request, dict) or not secrets.compare_digest(str(request.get("token", "")), self.token):
+            return {"ok": False, "error": "Invalid or missing token."}
+        action = request.get("action")
+        if action == "status":
+            return {"ok": True, "servers": self.status()}
+        if action == "shutdown":
+            self.shutdown_event.set()
+            return {"ok": True}
+        if action == "stats":
+            if self.metrics is None:
+                return {"ok": False, "error": "Metrics sampling is disabled."}
+            name = request.get("instance")
+            if name is not None and not self._valid_instance(name):
+                return {"ok": False, "error": f"Instance '{name}' does not exist."}
+            return {"ok": True, "stats": self.metrics.summary(name, with_history=name is not None)}
+
+        name = request.get("instance")
+        if not self._valid_instance(name):
+            return {"ok": False, "error": f"Instance '{name}' does not exist."}
+        if action == "start":
+            return {"ok": True, "server": self.start(name, bool(request.get("verify"))).status()}
+        if action == "stop":
+            if not await self.stop(name):
+                return {"ok": False, "error": f"Instance '{name}' is not managed by the supervisor."}
+            return {"ok": True, "server": self.servers[name].status()}
+        if action == "restart":
+            return {"ok": True, "server": (await self.restart(name)).status()}
+        return {"ok": False, "error": f"Unknown action '{action}'."}
+
+    async def _handle(self, reader, writer):
+        try:
+            line = await reader.readline()
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {"ok": False, "error": "Malformed request."}
+            else:
+                response = await self._dispatch(request)
+            writer.write(json.dumps(response).encode("utf-8") + b"\n")
+            await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _listen(self):
+        if os.name == "posix":
+            socket_path = self.state_path.with_suffix(".sock")
+            if socket_path.exists():
+                socket_path.unlink()
+            server = await asyncio.start_unix_server(self._handle, path=str(socket_path), limit=READ_LIMIT)
+            os.chmod(socket_path, 0o600)
+            return server, {"unix": str(socket_path)}
+        server = await asyncio.start_server(self._handle, "127.0.0.1", 0, limit=READ_LIMIT)
+        return server, {"host": "127.0.0.1", "port": server.sockets[0].getsockname()[1]}
+
+    async def _sample_metrics(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.metrics.sample)
+            except Exception as e:
+                print(f"Warning: Metrics sampling failed: {e}")
+            await asyncio.sleep(self.metrics.interval)
+
+    def _serve_metrics(self):
+        host, port = self.metrics_address
+        try:
+            httpd = metrics.serve_prometheus(self.metrics, host, port)
+        except OSError as e:
+            print(f"Warning: Could not serve metrics on {host}:{port}: {e}")
+            return None
+        print(f"Serving Prometheus metrics on http://{host}:{port}/metrics")
+        return httpd
+
+    async def serve(self, autostart=()):
+        self.shutdown_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.shutdown_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        server, address = await self._listen()
+        # The state file is created by mkstemp, so only this user can read
+        # the token in it.
+        config_store.write_json(self.state_path, dict(address, pid=os.getpid(), token=self.token))
+        print(f"Supervisor listening on {address.get('unix') or address['port']}.")
+        sampler = asyncio.create_task(self._sample_metrics()) if self.metrics is not None else None
+        metrics_httpd = self._serve_metrics() if self.metrics is not None and self.metrics_address else None
+        for name in autostart:
+            if self._valid_instance(name):
+                self.start(name)
+
+        try:
+            await self.shutdown_event.wait()
+        finally:
+            print("Stopping supervised servers...")
+            server.close()
+            if sampler is not None:
+                sampler.cancel()
+            if metrics_httpd is not None:
+                await asyncio.to_thread(metrics_httpd.shutdown)
+                metrics_httpd.server_close()
+            if self.state_path.exists():
+                self.state_path.unlink()
+            await asyncio.gather(*(self.stop(name) for name in list(self.servers)))
+            if "unix" in address and os.path.exists(address["unix"]):
+                os.unlink(address["unix"])
+
+    def run(self, autostart=()):
+        try:
+            with file_lock(self.state_path.with_suffix(".lock"), blocking=False):
+                asyncio.run(self.serve(autostart))
+        except LockBusy:
+            print("Error: A supervisor is already running for this instances folder.")
+            return False
+        return True
+
+
+def _connect(address: dict):
+    if "unix" in address:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect(address["unix"])
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    return socket.create_connection((address["host"], address["port"]), timeout=CONNECT_TIMEOUT)
+
+
+def send_request(state_path: Path, action: str, timeout: float = None, **fields):
+    # Returns None when no supervisor is reachable, so callers can fall back
+    # to running the server themselves.
+    address = config_store.read_json(state_path)
+    if not address:
+        return None
+    request = dict(fields, action=action, token=address.get("token", ""))
+    try:
+        with _connect(address) as sock:
+            sock.settimeout(timeout)
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as f:
+                line = f.readline()
+    except OSError:
+        return None
+    if not line:
+        return None
+    return json.loads(line)
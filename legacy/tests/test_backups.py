@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import backups
+
+
+class WriteZipTest(unittest.TestCase):
+    # The parallel path writes entries through ZipFile internals
+    # (_write_precompressed); these tests catch a CPython change breaking it.
+    def setUp(self):
+        self.parallel_file_limit = backups.PARALLEL_FILE_LIMIT
+        backups.PARALLEL_FILE_LIMIT = 64 * 1024
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = Path(self.tmp.name) / "world"
+        self.files = {
+            "level.dat": os.urandom(2048),
+            "session.lock": b"",
+            "region/r.0.0.mca": os.urandom(40 * 1024),
+            "region/r.0.1.mca": os.urandom(100 * 1024),
+            "data/raids.dat": b"raid " * 20000,
+            "playerdata/player.json": b'{"name": "steve"}\n' * 5000,
+        }
+        for i in range(40):
+            self.files[f"entities/e.{i}.dat"] = f"entity {i} ".encode() * (i * 50)
+        for rel_path, data in self.files.items():
+            path = self.source / rel_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+
+    def tearDown(self):
+        backups.PARALLEL_FILE_LIMIT = self.parallel_file_limit
+        self.tmp.cleanup()
+
+    def write(self, workers):
+        destination = Path(self.tmp.name) / f"backup-{workers}.zip"
+        written = backups.write_zip(backups.stream_files(self.source), destination,
+                                    store_precompressed=True, workers=workers)
+        self.assertEqual(written, len(self.files))
+        return destination
+
+    def assertRoundTrips(self, destination):
+        with zipfile.ZipFile(destination) as zipf:
+            self.assertIsNone(zipf.testzip())
+            self.assertEqual(sorted(zipf.namelist()), sorted(self.files))
+            for rel_path, data in self.files.items():
+                self.assertEqual(zipf.read(rel_path), data)
+            compress_types = {info.filename: info.compress_type for info in zipf.infolist()}
+        self.assertEqual(compress_types["region/r.0.0.mca"], zipfile.ZIP_STORED)
+        self.assertEqual(compress_types["data/raids.dat"], zipfile.ZIP_DEFLATED)
+
+    def test_parallel_archive_round_trips(self):
+        self.assertRoundTrips(self.write(workers=4))
+
+    def test_serial_archive_round_trips(self):
+        self.assertRoundTrips(self.write(workers=1))
+
+    def test_parallel_archive_can_be_appended_to(self):
+        # Appending reads the central directory back, so it checks the
+        # offsets _write_precompressed left behind.
+        destination = self.write(workers=4)
+        with zipfile.ZipFile(destination, "a") as zipf:
+            zipf.writestr("extra.txt", b"appended")
+        self.files["extra.txt"] = b"appended"
+        self.assertRoundTrips(destination)
+
+
+if __name__ == "__main__":
+    unittest.main()
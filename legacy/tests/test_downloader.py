@@ -0,0 +1,121 @@
+import hashlib
+import http.server
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import downloader
+
+PAYLOAD = os.urandom(256 * 1024)
+ETAG = '"payload-1"'
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # {range start: bytes to send before dropping the connection}, used once.
+    cut_after = {}
+    ranges = []
+
+    def _headers(self, status, length, content_range=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", ETAG)
+        if content_range:
+            self.send_header("Content-Range", content_range)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._headers(200, len(PAYLOAD))
+
+    def do_GET(self):
+        start, end = 0, len(PAYLOAD) - 1
+        header = self.headers.get("Range")
+        if header:
+            first, last = header.removeprefix("bytes=").split("-")
+            start, end = int(first), int(last)
+            self.ranges.append((start, end))
+            self._headers(206, end - start + 1, f"bytes {start}-{end}/{len(PAYLOAD)}")
+        else:
+            self._headers(200, len(PAYLOAD))
+        body = PAYLOAD[start:end + 1]
+        cut = self.cut_after.pop(start, None)
+        if cut is not None:
+            self.wfile.write(body[:cut])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SegmentedDownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.min_segment_size = downloader.MIN_SEGMENT_SIZE
+        downloader.MIN_SEGMENT_SIZE = 64 * 1024
+        RangeHandler.cut_after = {}
+        RangeHandler.ranges = []
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/server.jar"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.destination = Path(self.tmp.name) / "server.jar"
+
+    def tearDown(self):
+        downloader.MIN_SEGMENT_SIZE = self.min_segment_size
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_retries_interrupted_segment_from_its_offset(self):
+        second = 64 * 1024
+        RangeHandler.cut_after = {second: 10000}
+        client = downloader.Downloader(segments=4, buffer_size=4096, backoff=0)
+
+        sha1 = client.download(self.url, self.destination, expected_sha1=hashlib.sha1(PAYLOAD).hexdigest())
+
+        self.assertEqual(sha1, hashlib.sha1(PAYLOAD).hexdigest())
+        self.assertEqual(self.destination.read_bytes(), PAYLOAD)
+        retried = [start for start, end in RangeHandler.ranges if end == 2 * second - 1 and start != second]
+        self.assertEqual(len(retried), 1)
+        self.assertGreater(retried[0], second)
+        self.assertFalse(self.destination.with_name("server.jar.part.json").exists())
+
+    def test_resumes_interrupted_download(self):
+        second = 64 * 1024
+        RangeHandler.cut_after = {second: 10000}
+        failing = downloader.Downloader(segments=4, buffer_size=4096, retries=0)
+
+        with self.assertRaises(requests.exceptions.RequestException):
+            failing.download(self.url, self.destination)
+
+        state_path = self.destination.with_name("server.jar.part.json")
+        with open(state_path) as f:
+            state = json.load(f)
+        done = state["segments"][1]["done"]
+        self.assertGreater(done, 0)
+        self.assertLessEqual(done, 10000)
+        self.assertFalse(self.destination.exists())
+
+        RangeHandler.ranges = []
+        sha1 = downloader.Downloader(segments=4, buffer_size=4096).download(self.url, self.destination)
+
+        self.assertEqual(sha1, hashlib.sha1(PAYLOAD).hexdigest())
+        self.assertEqual(self.destination.read_bytes(), PAYLOAD)
+        self.assertIn((second + done, 2 * second - 1), RangeHandler.ranges)
+        self.assertNotIn((0, second - 1), RangeHandler.ranges)
+        self.assertFalse(state_path.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import rcon
+from rcon import RconClient, RconError
+
+try:
+    import main
+except ImportError:
+    main = None
+
+PASSWORD = "secret"
+
+
+def read_packet(conn):
+    header = b""
+    while len(header) < 4:
+        chunk = conn.recv(4 - len(header))
+        if not chunk:
+            return None
+        header += chunk
+    length = struct.unpack("<i", header)[0]
+    packet = b""
+    while len(packet) < length:
+        packet += conn.recv(length - len(packet))
+    request_id, packet_type = struct.unpack_from("<ii", packet)
+    return request_id, packet_type, packet[8:-2].decode("utf-8")
+
+
+def send_packet(conn, request_id, packet_type, body=""):
+    payload = struct.pack("<ii", request_id, packet_type) + body.encode("utf-8") + b"\x00\x00"
+    conn.sendall(struct.pack("<i", len(payload)) + payload)
+
+
+class StubRconServer:
+    # Replies with -1 as the id on a wrong password and echoes commands back.
+    # The empty response value sent before the auth response is not what
+    # Minecraft does; some Source RCON servers do, and the client accepts it.
+    def __init__(self, drop=()):
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        self.commands = []
+        # Commands that close the connection instead of answering, once each.
+        self.drop = list(drop)
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn:
+                self._handle(conn)
+
+    def _handle(self, conn):
+        request_id, packet_type, body = read_packet(conn)
+        if packet_type != rcon.SERVERDATA_AUTH:
+            return
+        send_packet(conn, request_id, rcon.SERVERDATA_RESPONSE_VALUE)
+        if body != PASSWORD:
+            send_packet(conn, -1, rcon.SERVERDATA_AUTH_RESPONSE)
+            return
+        send_packet(conn, request_id, rcon.SERVERDATA_AUTH_RESPONSE)
+        while True:
+            packet = read_packet(conn)
+            if packet is None:
+                return
+            request_id, packet_type, body = packet
+            self.commands.append(body)
+            if body in self.drop:
+                self.drop.remove(body)
+                return
+            send_packet(conn, request_id, rcon.SERVERDATA_RESPONSE_VALUE, f"ran {body}")
+
+    def close(self):
+        # shutdown() wakes the accept() that close() alone would leave blocked.
+        self.sock.shutdown(socket.SHUT_RDWR)
+        self.sock.close()
+        self.thread.join(timeout=5)
+
+
+class RconClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubRconServer()
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_authenticates_and_runs_commands(self):
+        with RconClient("127.0.0.1", self.server.port, PASSWORD, timeout=5) as client:
+            self.assertEqual(client.command("save-off"), "ran save-off")
+            self.assertEqual(client.command("save-all flush"), "ran save-all flush")
+        self.assertEqual(self.server.commands, ["save-off", "save-all flush"])
+
+    def test_wrong_password_is_rejected(self):
+        client = RconClient("127.0.0.1", self.server.port, "wrong", timeout=5)
+        with self.assertRaises(RconError):
+            client.connect()
+        with self.assertRaises(RconError):
+            client.command("save-on")
+
+    def test_command_fails_when_the_server_goes_away(self):
+        with RconClient("127.0.0.1", self.server.port, PASSWORD, timeout=5) as client:
+            client._sock.shutdown(socket.SHUT_WR)
+            with self.assertRaises((RconError, OSError)):
+                client.command("save-on")
+
+
+@unittest.skipIf(main is None, "main.py dependencies are not installed")
+class LiveBackupTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.instances = Path(self.tmp.name)
+        (self.instances / "live" / "world").mkdir(parents=True)
+        self.snapshot_tree = mock.Mock(return_value={"linked": 1})
+        self.create_backup = mock.Mock(return_value=True)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def live_backup(self, server):
+        properties = {"enable-rcon": "true", "rcon.password": PASSWORD, "rcon.port": str(server.port)}
+        config = dict(main.EMPTY_CONFIG, instances_folder=str(self.instances))
+        with mock.patch.object(main, "read_config", return_value=config), \
+                mock.patch.object(main, "is_instance_running", return_value=True), \
+                mock.patch.object(main, "read_server_properties", return_value=properties), \
+                mock.patch.object(main.backups, "snapshot_tree", self.snapshot_tree), \
+                mock.patch.object(main, "_create_backup", self.create_backup):
+            return main.live_backup_instance("live")
+
+    def test_pauses_saving_around_the_snapshot(self):
+        server = StubRconServer()
+        self.addCleanup(server.close)
+
+        self.assertTrue(self.live_backup(server))
+        self.assertEqual(server.commands, ["save-off", "save-all flush", "save-on"])
+        self.create_backup.assert_called_once()
+
+    def test_resumes_saving_when_the_snapshot_fails(self):
+        server = StubRconServer()
+        self.addCleanup(server.close)
+        self.snapshot_tree.side_effect = OSError("disk full")
+
+        self.assertFalse(self.live_backup(server))
+        self.assertEqual(server.commands, ["save-off", "save-all flush", "save-on"])
+        self.create_backup.assert_not_called()
+
+    def test_retries_save_on_over_a_new_connection(self):
+        server = StubRconServer(drop=["save-on"])
+        self.addCleanup(server.close)
+
+        self.assertTrue(self.live_backup(server))
+        self.assertEqual(server.commands, ["save-off", "save-all flush", "save-on", "save-on"])
+
+    def test_fails_when_saving_cannot_be_resumed(self):
+        server = StubRconServer(drop=["save-on", "save-on"])
+        self.addCleanup(server.close)
+
+        self.assertFalse(self.live_backup(server))
+        self.assertEqual(server.commands[-2:], ["save-on", "save-on"])
+        self.create_backup.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
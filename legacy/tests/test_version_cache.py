@@ -0,0 +1,39 @@
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from version_cache import VersionIndex
+
+MANIFEST = {
+    "latest": {"release": "1.21", "snapshot": "24w14a"},
+    "versions": [
+        {"id": "24w14a", "type": "snapshot", "releaseTime": "2024-04-03T00:00:00+00:00"},
+        {"id": "1.21", "type": "release", "releaseTime": "2024-06-13T00:00:00+00:00"},
+        {"id": "1.20.6", "type": "release", "releaseTime": "2024-04-29T00:00:00+00:00"},
+        {"id": "1.20.5", "type": "release", "releaseTime": "2024-04-23T00:00:00+00:00"},
+        {"id": "1.20.4", "type": "release", "releaseTime": "2023-12-07T00:00:00+00:00"},
+    ],
+}
+
+
+class VersionIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = VersionIndex(MANIFEST)
+
+    def test_between_lists_the_range_in_release_order(self):
+        self.assertEqual(self.index.between("1.20.4", "1.20.6"), ["1.20.4", "24w14a", "1.20.5", "1.20.6"])
+        self.assertEqual(self.index.between("1.20.6", "1.20.4"), ["1.20.4", "24w14a", "1.20.5", "1.20.6"])
+
+    def test_between_filters_by_type_and_resolves_aliases(self):
+        self.assertEqual(self.index.between("1.20.4", "latest", "release"), ["1.20.4", "1.20.5", "1.20.6", "1.21"])
+        self.assertEqual(self.index.between("1.20.4", "1.21", "snapshot"), ["24w14a"])
+
+    def test_between_rejects_unknown_versions(self):
+        with self.assertRaises(ValueError):
+            self.index.between("1.20.4", "9.9")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import bisect
+import json
+import time
+from pathlib import Path
+
+import requests
+
+import config_store
+
+MANIFEST_URL = "https://piston-meta.mojang.com/mc/game/version_manifest_v2.json"
+MANIFEST_TTL = 3600
+
+
+def _read_json(path: Path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class VersionIndex:
+    def __init__(self, manifest: dict):
+        self.latest = manifest.get("latest", {})
+        versions = manifest.get("versions", [])
+        self.by_id = {entry.get("id"): entry for entry in versions}
+
+        ordered = sorted(versions, key=lambda entry: entry.get("releaseTime", ""))
+        self.ordered_ids = [entry.get("id") for entry in ordered]
+        self.position = {ver_id: i for i, ver_id in enumerate(self.ordered_ids)}
+
+        self.by_type = {}
+        for entry in ordered:
+            self.by_type.setdefault(entry.get("type"), []).append(entry.get("id"))
+        self._type_positions = {
+            ver_type: [self.position[ver_id] for ver_id in ids] for ver_type, ids in self.by_type.items()
+        }
+        self._sorted_ids = sorted(self.by_id)
+
+    def resolve(self, ver_id: str):
+        if ver_id in ("latest", "l"):
+            return self.latest.get("release")
+        if ver_id in ("snapshot", "s"):
+            return self.latest.get("snapshot")
+        return ver_id
+
+    def get(self, ver_id: str):
+        return self.by_id.get(self.resolve(ver_id))
+
+    def _filter(self, ids, ver_type):
+        if ver_type is None:
+            return ids
+        return [ver_id for ver_id in ids if self.by_id[ver_id].get("type") == ver_type]
+
+    def latest_before(self, ver_id: str, ver_type: str = "release"):
+        ver_id = self.resolve(ver_id)
+        if ver_id not in self.position:
+            raise ValueError(f"Version '{ver_id}' not found.")
+        positions = self._type_positions.get(ver_type, [])
+        i = bisect.bisect_left(positions, self.position[ver_id])
+        if i == 0:
+            return None
+        return self.ordered_ids[positions[i - 1]]
+
+    def series(self, prefix: str, ver_type: str = None):
+        start = bisect.bisect_left(self._sorted_ids, prefix)
+        end = bisect.bisect_left(self._sorted_ids, prefix + "\uffff")
+        ids = [ver_id for ver_id in self._sorted_ids[start:end]
+               if ver_id == prefix or ver_id[len(prefix)] in ".-_ "]
+        ids.sort(key=self.position.__getitem__)
+        return self._filter(ids, ver_type)
+
+    def between(self, start_id: str, end_id: str, ver_type: str = None):
+        start_id, end_id = self.resolve(start_id), self.resolve(end_id)
+        for ver_id in (start_id, end_id):
+            if ver_id not in self.position:
+                raise ValueError(f"Version '{ver_id}' not found.")
+        start, end = sorted((self.position[start_id], self.position[end_id]))
+        if ver_type is None:
+            return self.ordered_ids[start:end + 1]
+        positions = self._type_positions.get(ver_type, [])
+        lo = bisect.bisect_left(positions, start)
+        hi = bisect.bisect_right(positions, end)
+        return [self.ordered_ids[pos] for pos in positions[lo:hi]]
+
+
+class VersionCache:
+    def __init__(self, cache_dir: Path, ttl: int = MANIFEST_TTL, session=None):
+        self.cache_dir = Path(cache_dir)
+        self.session = session or requests
+        self.ttl = ttl
+        self.manifest_path = self.cache_dir / "version_manifest_v2.json"
+        self.meta_path = self.cache_dir / "version_manifest_v2.meta.json"
+        self.packages_dir = self.cache_dir / "packages"
+        self._manifest = None
+        self._index = None
+        self._index_source = None
+
+    def get_manifest(self, force_refresh=False):
+        if self._manifest is not None and not force_refresh:
+            return self._manifest
+
+        meta = _read_json(self.meta_path) or {}
+        cached = _read_json(self.manifest_path)
+        if cached is not None and not force_refresh and time.time() - meta.get("fetched_at", 0) < self.ttl:
+            self._manifest = cached
+            return cached
+
+        headers = {}
+        if cached is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            response = self.session.get(MANIFEST_URL, headers=headers)
+            if response.status_code == 304 and cached is not None:
+                meta["fetched_at"] = time.time()
+                config_store.write_json(self.meta_path, meta)
+                self._manifest = cached
+                return cached
+            response.raise_for_status()
+            manifest = response.json()
+        except requests.exceptions.RequestException as e:
+            if cached is None:
+                raise
+            print(f"Warning: Could not refresh version manifest ({e}). Using cached copy.")
+            self._manifest = cached
+            return cached
+
+        config_store.write_json(self.manifest_path, manifest)
+        config_store.write_json(self.meta_path, {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        })
+        self._manifest = manifest
+        return manifest
+
+    def get_index(self, force_refresh=False):
+        manifest = self.get_manifest(force_refresh)
+        if self._index is None or self._index_source is not manifest:
+            self._index = VersionIndex(manifest)
+            self._index_source = manifest
+        return self._index
+
+    def get_cached_package(self, ver_id: str):
+        return _read_json(self.packages_dir / f"{ver_id}.json")
+
+    def get_package(self, ver_id: str, url: str):
+        package = self.get_cached_package(ver_id)
+        if package is not None:
+            return package
+
+        response = self.session.get(url)
+        response.raise_for_status()
+        package = response.json()
+        config_store.write_json(self.packages_dir / f"{ver_id}.json", package)
+        return package
@@ -0,0 +1,93 @@
+import re
+from fnmatch import fnmatchcase
+
+DIMENSION_FOLDERS = {
+    "overworld": "",
+    "minecraft:overworld": "",
+    "nether": "DIM-1/",
+    "the_nether": "DIM-1/",
+    "minecraft:the_nether": "DIM-1/",
+    "end": "DIM1/",
+    "the_end": "DIM1/",
+    "minecraft:the_end": "DIM1/",
+}
+REGION_FOLDERS = ("region", "entities", "poi")
+REGION_NAME = re.compile(r"r\.(-?\d+)\.(-?\d+)\.mca")
+
+
+class SelectionError(ValueError):
+    pass
+
+
+def dimension_prefix(dimension: str):
+    dimension = dimension.strip()
+    if dimension in DIMENSION_FOLDERS:
+        return DIMENSION_FOLDERS[dimension]
+    if ":" in dimension:
+        namespace, _, name = dimension.partition(":")
+        return f"dimensions/{namespace}/{name}/"
+    raise SelectionError(f"Unknown dimension '{dimension}'. Use overworld, nether, end or namespace:name.")
+
+
+def parse_box(value: str):
+    dimension = "overworld"
+    if "@" in value:
+        dimension, _, value = value.rpartition("@")
+    try:
+        x1, z1, x2, z2 = (int(part) for part in value.split(","))
+    except ValueError:
+        raise SelectionError(f"Invalid box '{value}'. Use x1,z1,x2,z2 in block coordinates, optionally prefixed with 'dimension@'.")
+    return {
+        "prefix": dimension_prefix(dimension),
+        "chunks": (min(x1, x2) >> 4, min(z1, z2) >> 4, max(x1, x2) >> 4, max(z1, z2) >> 4),
+    }
+
+
+def region_of(name: str, prefix: str):
+    if not name.startswith(prefix):
+        return None
+    folder, _, file_name = name[len(prefix):].partition("/")
+    if folder not in REGION_FOLDERS:
+        return None
+    match = REGION_NAME.fullmatch(file_name)
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def chunks_in_box(region, box):
+    rx, rz = region
+    cx1, cz1, cx2, cz2 = box["chunks"]
+    indexes = set()
+    for cz in range(max(cz1, rz * 32), min(cz2, rz * 32 + 31) + 1):
+        for cx in range(max(cx1, rx * 32), min(cx2, rx * 32 + 31) + 1):
+            indexes.add((cx & 31) + (cz & 31) * 32)
+    return indexes
+
+
+def select_members(names, globs=(), dimensions=(), boxes=()):
+    prefixes = [dimension_prefix(dimension) for dimension in dimensions]
+    whole = []
+    partial = {}
+    for name in names:
+        if any(fnmatchcase(name, pattern) for pattern in globs):
+            whole.append(name)
+            continue
+        if any(_in_dimension(name, prefix) for prefix in prefixes):
+            whole.append(name)
+            continue
+        indexes = set()
+        for box in boxes:
+            region = region_of(name, box["prefix"])
+            if region is not None:
+                indexes |= chunks_in_box(region, box)
+        if indexes:
+            partial[name] = indexes
+    return whole, partial
+
+
+def _in_dimension(name: str, prefix: str):
+    if prefix:
+        return name.startswith(prefix)
+    # The overworld lives in the world root next to the other dimensions.
+    return name.partition("/")[0] in REGION_FOLDERS